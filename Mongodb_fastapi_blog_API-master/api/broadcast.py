@@ -0,0 +1,273 @@
+"""Live post events for GET /blog/stream.
+
+A write publishes an event once. The broadcaster builds its wire formats
+once and puts the same objects on every subscriber's queue, so the cost
+per client is one put_nowait. Queues are bounded: a client that falls
+BROADCAST_QUEUE_SIZE events behind is disconnected instead of buffered
+without limit, and reconnects (EventSource does so by itself) from the
+current state of the feed.
+
+The backend decides which subscribers an event reaches. memory:// only
+reaches clients of the worker that handled the write, so it is refused
+when more than one worker is configured; with a postgresql://
+BROADCAST_URL (the default when DATABASE_URL is Postgres and there are
+several workers) every event goes through LISTEN/NOTIFY and reaches the
+clients of all workers. Events published while the LISTEN
+connection is down are lost for that worker. A post summary (title up to
+255 characters, excerpt up to 300) stays well under NOTIFY's 8000 byte
+payload limit.
+"""
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, NamedTuple, Optional, Set
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[str, bytes], None]
+
+
+class Event(NamedTuple):
+    name: str
+    sse: bytes  # text/event-stream frame
+    text: str  # WebSocket message
+
+
+def make_event(name: str, data: bytes) -> Event:
+    return Event(
+        name,
+        b"event: " + name.encode() + b"\ndata: " + data + b"\n\n",
+        '{"event":"%s","data":%s}' % (name, data.decode()),
+    )
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscriber:
+    def __init__(self, queue_size: int):
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(queue_size)
+        self.closed = False
+
+    def close(self):
+        """End the subscriber's event stream, dropping whatever it has not read"""
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def events(self, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[Event]]:
+        """Yield events until closed; None after `heartbeat` idle seconds"""
+        while True:
+            try:
+                event = await asyncio.wait_for(self.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if event is None:
+                return
+            yield event
+
+
+class BroadcastBackend:
+    """Interface for event transports; `deliver` fans an event out to this worker's subscribers"""
+
+    async def start(self, deliver: Deliver) -> None:
+        raise NotImplementedError
+
+    async def publish(self, name: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        pass
+
+
+class MemoryBroadcastBackend(BroadcastBackend):
+    """Events stay in the worker that published them"""
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def publish(self, name: str, data: bytes) -> None:
+        if self._deliver is not None:
+            self._deliver(name, data)
+
+
+class PostgresBroadcastBackend(BroadcastBackend):
+    """Events shared by every worker LISTENing on the channel, publisher included"""
+
+    def __init__(self, dsn: str, channel: str = "blog_events", reconnect_delay: float = 1.0):
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._deliver: Optional[Deliver] = None
+        self._pool = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_url(cls, url: str) -> "PostgresBroadcastBackend":
+        try:
+            import asyncpg  # noqa: F401
+        except ImportError:
+            raise RuntimeError("BROADCAST_URL points to postgres but the asyncpg package is not installed")
+        return cls(url.replace("postgresql+asyncpg://", "postgresql://", 1))
+
+    async def start(self, deliver: Deliver) -> None:
+        import asyncpg
+
+        self._deliver = deliver
+        self._pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=2)
+        self._task = asyncio.create_task(self._listen(), name="broadcast-listen")
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        name, _, data = payload.partition("\n")
+        self._deliver(name, data.encode())
+
+    async def _listen(self):
+        import asyncpg
+
+        while True:
+            lost = asyncio.Event()
+            try:
+                connection = await asyncpg.connect(self.dsn)
+            except Exception:
+                logger.warning("Broadcast LISTEN connection failed, retrying", exc_info=True)
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+            connection.add_termination_listener(lambda _: lost.set())
+            try:
+                await connection.add_listener(self.channel, self._on_notify)
+                await lost.wait()
+            except asyncpg.PostgresError:
+                logger.warning("Broadcast LISTEN failed, retrying", exc_info=True)
+            finally:
+                connection.terminate()
+            logger.warning("Broadcast LISTEN connection lost, reconnecting")
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def publish(self, name: str, data: bytes) -> None:
+        await self._pool.execute("SELECT pg_notify($1, $2)", self.channel, name + "\n" + data.decode())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+class Broadcaster:
+    """Subscribers of this worker; without a backend, the configured one is built on first use"""
+
+    def __init__(self, backend: Optional[BroadcastBackend] = None, queue_size: int = 64,
+                 max_subscribers: int = 10000):
+        self._backend = backend
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: Set[Subscriber] = set()
+        self.published = 0
+        self.delivered = 0
+        self.evicted = 0
+        self.publish_failures = 0
+
+    @property
+    def backend(self) -> BroadcastBackend:
+        if self._backend is None:
+            self._backend = _build_backend()
+        return self._backend
+
+    async def start(self):
+        await self.backend.start(self._fanout)
+
+    async def stop(self):
+        for subscriber in self._subscribers:
+            subscriber.close()
+        self._subscribers.clear()
+        await self.backend.stop()
+
+    @property
+    def full(self) -> bool:
+        return len(self._subscribers) >= self.max_subscribers
+
+    def subscribe(self) -> Subscriber:
+        if self.full:
+            raise TooManySubscribers()
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+        subscriber.close()
+
+    async def publish(self, name: str, data: bytes):
+        """Send a JSON event to every subscriber; failures are logged, never raised to the writer"""
+        try:
+            await self.backend.publish(name, data)
+        except Exception:
+            self.publish_failures += 1
+            logger.warning("Broadcast publish failed", exc_info=True, extra={"event": name})
+            return
+        self.published += 1
+
+    def _fanout(self, name: str, data: bytes):
+        if not self._subscribers:
+            return
+        event = make_event(name, data)
+        slow = []
+        for subscriber in self._subscribers:
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                slow.append(subscriber)
+        self.delivered += len(self._subscribers) - len(slow)
+        for subscriber in slow:
+            self.unsubscribe(subscriber)
+        if slow:
+            self.evicted += len(slow)
+            logger.info("Dropped slow stream subscribers", extra={"count": len(slow)})
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "evicted": self.evicted,
+            "publish_failures": self.publish_failures,
+        }
+
+
+def _is_postgres(url: Optional[str]) -> bool:
+    return bool(url) and url.startswith(("postgres://", "postgresql://", "postgresql+asyncpg://"))
+
+
+def _build_backend() -> BroadcastBackend:
+    settings = get_settings()
+    url = settings.broadcast_url
+    if url is None:
+        database_url = settings.database.url
+        url = database_url if settings.web_concurrency > 1 and _is_postgres(database_url) else "memory://"
+    if _is_postgres(url):
+        return PostgresBroadcastBackend.from_url(url)
+    if settings.web_concurrency > 1:
+        raise RuntimeError(
+            f"{settings.web_concurrency} workers would each deliver only their own post events: "
+            "set BROADCAST_URL to a postgresql:// URL, or WEB_CONCURRENCY=1"
+        )
+    return MemoryBroadcastBackend()
+
+
+_settings = get_settings()
+broadcaster = Broadcaster(
+    queue_size=_settings.broadcast_queue_size,
+    max_subscribers=_settings.broadcast_max_subscribers,
+)
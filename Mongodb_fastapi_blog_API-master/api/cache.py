@@ -0,0 +1,259 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from threading import Lock
+from typing import Any, Dict, Hashable, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# Read endpoints store their serialized JSON body here together with an ETag,
+# so a hit costs neither a query nor pydantic serialization, and a matching
+# If-None-Match costs nothing but a 304. Backends only deal in bytes so a
+# shared store (Redis) can replace the per-worker memory one.
+
+class CacheBackend:
+    """Interface for response cache stores"""
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    """Per-worker LRU store; invalidations are not seen by other workers"""
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 300.0):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Counters version the entries, so they live outside the LRU: an
+        # evicted counter would restart at 0 and bring stale entries back
+        self._counters: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if key in self._counters:
+            return str(self._counters[key]).encode()
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self._cache.set(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        self._counters.pop(key, None)
+        self._cache.delete(key)
+
+    async def incr(self, key: str) -> int:
+        value = self._counters[key] = self._counters.get(key, 0) + 1
+        return value
+
+
+class NullBackend(CacheBackend):
+    """Stores nothing; every lookup misses"""
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        pass
+
+    async def delete(self, key: str) -> None:
+        pass
+
+    async def incr(self, key: str) -> int:
+        return 0
+
+
+class RedisBackend(CacheBackend):
+    """Shared store for multi-worker deployments, on any redis.asyncio-compatible client"""
+
+    def __init__(self, client, ttl: float = 300.0):
+        self._client = client
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url: str, ttl: float = 300.0) -> "RedisBackend":
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_URL points to redis but the redis package is not installed")
+        return cls(redis.from_url(url), ttl=ttl)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        await self._client.set(key, value, px=int((self.ttl if ttl is None else ttl) * 1000))
+
+    async def delete(self, key: str) -> None:
+        await self._client.delete(key)
+
+    async def incr(self, key: str) -> int:
+        return await self._client.incr(key)
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    headers: Dict[str, str]
+
+
+def make_entry(body: bytes, headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+    etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+    return CachedResponse(body, etag, headers or {})
+
+
+def _dumps(entry: CachedResponse) -> bytes:
+    meta = json.dumps({"etag": entry.etag, "headers": entry.headers}).encode()
+    return meta + b"\n" + entry.body
+
+
+def _loads(raw: bytes) -> CachedResponse:
+    meta, body = raw.split(b"\n", 1)
+    meta = json.loads(meta)
+    return CachedResponse(body, meta["etag"], meta["headers"])
+
+
+class ResponseCache:
+    """Response entries on a backend; without one, the configured backend is built on first use"""
+
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        self._backend = backend
+
+    @property
+    def backend(self) -> CacheBackend:
+        if self._backend is None:
+            self._backend = _build_backend()
+        return self._backend
+
+    def start(self):
+        """Build the configured backend now, so a bad configuration fails at startup"""
+        if self._backend is None:
+            self._backend = _build_backend()
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        raw = await self.backend.get(key)
+        return _loads(raw) if raw is not None else None
+
+    async def set(self, key: str, entry: CachedResponse) -> None:
+        await self.backend.set(key, _dumps(entry))
+
+    async def delete(self, key: str) -> None:
+        await self.backend.delete(key)
+
+    async def generation(self, namespace: str) -> int:
+        """Current version of a group of keys, bumped by invalidate_namespace"""
+        raw = await self.backend.get(f"{namespace}:gen")
+        return int(raw) if raw is not None else 0
+
+    async def invalidate_namespace(self, namespace: str) -> None:
+        await self.backend.incr(f"{namespace}:gen")
+
+
+def http_date(value: datetime) -> str:
+    """Last-Modified value for a naive UTC datetime"""
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def _not_modified(request: Request, entry: CachedResponse) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # Weak comparison: the compression middleware sends W/ versions of our tags
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or entry.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = entry.headers.get("Last-Modified")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def conditional_response(request: Request, entry: CachedResponse) -> Response:
+    """200 with the cached body, or an empty 304 if the client's copy is current.
+
+    If-None-Match wins over If-Modified-Since; the latter is only checked
+    for entries stored with a Last-Modified header.
+    """
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", **entry.headers}
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def _build_backend() -> CacheBackend:
+    # A write only invalidates the memory backend of the worker handling it;
+    # with several workers the others would serve the old post and feed pages
+    # (and 304s for the old ETag) until the entries expire
+    settings = get_settings()
+    url, ttl = settings.response_cache_url, settings.response_cache_ttl
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisBackend.from_url(url, ttl=ttl)
+    if settings.web_concurrency > 1:
+        if url is not None:
+            raise RuntimeError(
+                f"{settings.web_concurrency} workers cannot share a {url} response cache: "
+                "set RESPONSE_CACHE_URL to a redis:// URL, or WEB_CONCURRENCY=1"
+            )
+        logger.warning("Response cache off: %d workers and no RESPONSE_CACHE_URL", settings.web_concurrency)
+        return NullBackend()
+    return MemoryBackend(maxsize=settings.response_cache_size, ttl=ttl)
+
+
+response_cache = ResponseCache()
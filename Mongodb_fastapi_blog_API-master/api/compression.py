@@ -0,0 +1,207 @@
+"""Response compression.
+
+Negotiates zstd, br or gzip from Accept-Encoding, preferring them in the
+COMPRESSION_ENCODINGS order when the client weighs them equally. zstd
+and br need the zstandard and brotli packages and are skipped when
+those are not installed. Bodies under COMPRESSION_MIN_SIZE go out as
+they are. Streamed bodies (the NDJSON export) are compressed chunk by
+chunk and flushed after each one, so the client keeps receiving rows.
+Event streams are never compressed.
+
+Compressed responses carry a weak ETag, since their bytes differ from
+the identity representation. Complete bodies with an ETag are compressed
+once per encoding and kept in a small LRU, so cached feed pages are not
+compressed again on every hit.
+"""
+import gzip
+import zlib
+from typing import Dict, Iterable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .cache import TTLCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Levels for responses compressed on the fly: most of the ratio, little CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+UNCOMPRESSIBLE_TYPES = ("text/event-stream",)
+
+
+class GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+# Streaming encoders, and one-shot functions for complete bodies
+ENCODERS = {"gzip": GzipEncoder}
+_COMPRESS = {"gzip": lambda data: gzip.compress(data, GZIP_LEVEL, mtime=0)}
+if brotli is not None:
+    ENCODERS["br"] = BrotliEncoder
+    _COMPRESS["br"] = lambda data: brotli.compress(data, quality=BROTLI_QUALITY)
+if zstandard is not None:
+    ENCODERS["zstd"] = ZstdEncoder
+    # Setting up a context costs more than compressing a small page, so
+    # one is shared; only the event loop thread uses it
+    _COMPRESS["zstd"] = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress
+
+
+def compress(encoding: str, data: bytes) -> bytes:
+    return _COMPRESS[encoding](data)
+
+
+def negotiate(accept_encoding: str, encodings: Iterable[str]) -> Optional[str]:
+    """Best of `encodings` for an Accept-Encoding value: highest q, then our order"""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for coding in encodings:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "")
+    return (
+        "content-encoding" not in headers
+        and content_type.startswith(COMPRESSIBLE_TYPES)
+        and not content_type.startswith(UNCOMPRESSIBLE_TYPES)
+    )
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, encodings: Iterable[str] = ("zstd", "br", "gzip"),
+                 cache_size: int = 256):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = [e for e in encodings if e in ENCODERS]
+        # (etag, encoding) -> compressed body
+        self._compressed = TTLCache(maxsize=cache_size, ttl=3600)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD" or not self.encodings:
+            return await self.app(scope, receive, send)
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        start = None
+        encoder = None
+
+        async def compressing_send(message):
+            nonlocal start, encoder
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if message["status"] in (204, 304) or not _compressible(headers):
+                    await send(message)
+                    return
+                start = message
+                MutableHeaders(raw=start["headers"]).add_vary_header("Accept-Encoding")
+                if encoding is None:
+                    start = None
+                    await send(message)
+                return
+            if start is None and encoder is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is not None:
+                data = encoder.compress(body) + (encoder.flush() if more_body else encoder.finish())
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            if not more_body:
+                if len(body) < self.minimum_size:
+                    await send(start)
+                    await send(message)
+                    return
+                etag = headers.get("etag")
+                compressed = self._compressed.get((etag, encoding)) if etag else None
+                if compressed is None:
+                    compressed = compress(encoding, body)
+                    if etag:
+                        self._compressed.set((etag, encoding), compressed)
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(compressed))
+                _weaken_etag(headers)
+                await send(start)
+                await send({"type": "http.response.body", "body": compressed})
+                return
+
+            encoder = ENCODERS[encoding]()
+            headers["content-encoding"] = encoding
+            if "content-length" in headers:
+                del headers["content-length"]
+            _weaken_etag(headers)
+            await send(start)
+            await send({"type": "http.response.body", "body": encoder.compress(body) + encoder.flush(),
+                        "more_body": True})
+
+        await self.app(scope, receive, compressing_send)
+
+
+def _weaken_etag(headers: MutableHeaders):
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["etag"] = "W/" + etag
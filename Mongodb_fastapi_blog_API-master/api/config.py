@@ -0,0 +1,131 @@
+"""Application settings.
+
+Everything the app reads from the environment (or a .env file) is read
+here, once per process: `get_settings()` builds the Settings object on
+first use and returns the same instance afterwards.
+"""
+import os
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+class DatabaseSettings:
+    def __init__(self):
+        self.url = os.getenv("DATABASE_URL")
+        self.replica_url = os.getenv("DATABASE_REPLICA_URL") or None
+        self.echo = env_flag("DB_ECHO", "false")
+        self.pool_size = int(os.getenv("DB_POOL_SIZE", 10))
+        self.max_overflow = int(os.getenv("DB_MAX_OVERFLOW", 20))
+        self.pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", 30))
+        self.pool_recycle = int(os.getenv("DB_POOL_RECYCLE", 1800))
+        self.pool_pre_ping = env_flag("DB_POOL_PRE_PING", "true")
+        self.statement_cache_size = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 500))
+        # Development only: run `alembic upgrade head` at startup instead of
+        # refusing to start on an out-of-date schema
+        self.auto_migrate = env_flag("DB_AUTO_MIGRATE", "false")
+
+
+class SMTPSettings:
+    def __init__(self):
+        self.server = os.getenv('MAIL_SERVER')
+        self.port = int(os.getenv('MAIL_PORT', 587))
+        self.username = os.getenv('MAIL_USERNAME')
+        self.password = os.getenv('MAIL_PASSWORD')
+        self.starttls = env_flag('MAIL_STARTTLS', 'true')
+        self.ssl_tls = env_flag('MAIL_SSL_TLS', 'false')
+        self.use_credentials = env_flag('MAIL_USE_CREDENTIALS', 'true')
+        self.validate_certs = env_flag('MAIL_VALIDATE_CERTS', 'true')
+        self.timeout = float(os.getenv('MAIL_TIMEOUT', 30))
+
+
+class Settings:
+    def __init__(self):
+        self.database = DatabaseSettings()
+        self.smtp = SMTPSettings()
+
+        # Auth
+        self.secret_key: Optional[str] = os.getenv("SECRET_KEY")
+        self.algorithm: Optional[str] = os.getenv("ALGORITHM")
+        self.access_token_expire_minutes = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+        self.user_cache_ttl = float(os.getenv("USER_CACHE_TTL", 60))
+        self.user_cache_size = int(os.getenv("USER_CACHE_SIZE", 10000))
+        self.auth_stateless = env_flag("AUTH_STATELESS")
+        self.bcrypt_rounds = int(os.getenv("BCRYPT_ROUNDS", 12))
+        self.password_hash_workers = int(os.getenv("PASSWORD_HASH_WORKERS", 0)) or None
+
+        # Rate limits ("<requests>/<second|minute|hour|day>"); RATE_LIMIT_URL
+        # memory:// keeps buckets per worker, redis://... shares them. Per-IP
+        # limits count the address uvicorn reports: behind a proxy, list it in
+        # FORWARDED_ALLOW_IPS (main.py) or every client shares its bucket
+        self.rate_limit_enabled = env_flag("RATE_LIMIT_ENABLED", "true")
+        self.rate_limit_url = os.getenv("RATE_LIMIT_URL", "memory://")
+        self.rate_limit_shards = int(os.getenv("RATE_LIMIT_SHARDS", 16))
+        self.rate_limit_max_keys = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100_000))
+        self.rate_limit_login_ip = os.getenv("RATE_LIMIT_LOGIN_IP", "30/minute")
+        self.rate_limit_login_user = os.getenv("RATE_LIMIT_LOGIN_USER", "10/minute")
+        self.rate_limit_reset_ip = os.getenv("RATE_LIMIT_RESET_IP", "10/hour")
+        self.rate_limit_reset_email = os.getenv("RATE_LIMIT_RESET_EMAIL", "3/hour")
+        self.rate_limit_registration_ip = os.getenv("RATE_LIMIT_REGISTRATION_IP", "10/hour")
+
+        # View counts (api/views.py)
+        self.views_flush_interval = float(os.getenv("VIEWS_FLUSH_INTERVAL", 5))
+        self.views_reload_interval = float(os.getenv("VIEWS_RELOAD_INTERVAL", 60))
+        self.views_top_k = int(os.getenv("VIEWS_TOP_K", 100))
+
+        # Live post events (api/broadcast.py); BROADCAST_URL memory:// reaches
+        # this worker's clients only, postgresql://... all workers' clients.
+        # Unset, it is DATABASE_URL when that is Postgres and WEB_CONCURRENCY
+        # (exported by main.py) is above 1, memory:// otherwise
+        self.broadcast_url = os.getenv("BROADCAST_URL") or None
+        self.web_concurrency = int(os.getenv("WEB_CONCURRENCY", 1))
+        self.broadcast_queue_size = int(os.getenv("BROADCAST_QUEUE_SIZE", 64))
+        self.broadcast_max_subscribers = int(os.getenv("BROADCAST_MAX_SUBSCRIBERS", 10000))
+        self.broadcast_heartbeat = float(os.getenv("BROADCAST_HEARTBEAT", 15))
+
+        # Mail
+        self.mail_from = os.getenv("MAIL_FROM")
+        self.mail_from_name = os.getenv("MAIL_FROM_NAME", "FastAPI Blog")
+        self.mail_queue_size = int(os.getenv("MAIL_QUEUE_SIZE", 1000))
+        self.mail_workers = int(os.getenv("MAIL_WORKERS", 2))
+        self.mail_max_retries = int(os.getenv("MAIL_MAX_RETRIES", 3))
+        self.mail_retry_backoff = float(os.getenv("MAIL_RETRY_BACKOFF", 1.0))
+        self.mail_drain_timeout = float(os.getenv("MAIL_DRAIN_TIMEOUT", 10))
+
+        # Responses
+        # RESPONSE_CACHE_URL memory:// is per worker, so refused with several
+        # workers; unset, it is memory:// for one worker and no cache for more
+        self.response_cache_url = os.getenv("RESPONSE_CACHE_URL") or None
+        self.response_cache_ttl = float(os.getenv("RESPONSE_CACHE_TTL", 300))
+        self.response_cache_size = int(os.getenv("RESPONSE_CACHE_SIZE", 1000))
+        self.fast_json = env_flag("FAST_JSON")
+        # COMPRESSION_ENCODINGS in order of preference; empty turns compression off
+        self.compression_encodings = [
+            e.strip() for e in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",") if e.strip()
+        ]
+        self.compression_min_size = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+        self.compression_cache_size = int(os.getenv("COMPRESSION_CACHE_SIZE", 256))
+        # How long browsers may reuse a CORS preflight (Chromium caps it at 7200)
+        self.cors_max_age = int(os.getenv("CORS_MAX_AGE", 7200))
+
+        # Metrics; main.py points METRICS_DIR at a fresh directory when it
+        # starts several workers, which publish their values there
+        self.metrics_dir = os.getenv("METRICS_DIR") or None
+        self.metrics_flush_interval = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+
+        # Logging
+        self.log_format = os.getenv("LOG_FORMAT", "json").lower()
+        self.log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+        self.log_sample_rates = os.getenv("LOG_SAMPLE_RATES", "")
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
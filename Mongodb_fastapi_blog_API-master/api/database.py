@@ -1,29 +1,134 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-import os
-from dotenv import load_dotenv
 
-load_dotenv()
+from .config import get_settings
+from .db_config import build_engine
+from .metrics import instrument_engine
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+MIGRATIONS_DIR = ALEMBIC_INI.parent / "migrations" / "versions"
+_REVISION = re.compile(r"^revision\b[^=]*=\s*['\"](\w+)['\"]", re.MULTILINE)
+_DOWN_REVISION = re.compile(r"^down_revision\b[^=]*=\s*['\"](\w+)['\"]", re.MULTILINE)
 
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+Base = declarative_base()
 
-AsyncSessionLocal = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False
-)
+# Engines and session factories are built on first use, not at import, so
+# importing the app (tools, migrations, each worker before it serves) stays
+# cheap and nothing connects until a request or the lifespan needs to.
 
-Base = declarative_base()
+@lru_cache
+def get_engine() -> AsyncEngine:
+    engine = build_engine(get_settings().database.url, get_settings().database)
+    instrument_engine(engine)
+    return engine
+
+@lru_cache
+def get_replica_engine() -> Optional[AsyncEngine]:
+    """GET endpoints read from the replica when one is configured"""
+    settings = get_settings().database
+    if not settings.replica_url:
+        return None
+    engine = build_engine(settings.replica_url, settings)
+    instrument_engine(engine)
+    return engine
+
+@lru_cache
+def session_factory() -> async_sessionmaker:
+    return async_sessionmaker(get_engine(), class_=AsyncSession, expire_on_commit=False)
+
+@lru_cache
+def read_session_factory() -> async_sessionmaker:
+    replica = get_replica_engine()
+    if replica is None:
+        return session_factory()
+    return async_sessionmaker(replica, class_=AsyncSession, expire_on_commit=False)
 
 async def get_db():
-    async with AsyncSessionLocal() as session:
+    async with session_factory()() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+async def get_read_db():
+    async with read_session_factory()() as session:
         try:
             yield session
         finally:
             await session.close()
 
+def _alembic_config(connection=None):
+    from alembic.config import Config
+
+    config = Config(str(ALEMBIC_INI))
+    # alembic.ini's script_location is relative to the directory alembic runs from
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "migrations"))
+    config.attributes["connection"] = connection
+    return config
+
+def migration_head() -> str:
+    """Newest revision under migrations/versions.
+
+    Read from the files directly: importing alembic's runtime costs more
+    than the rest of startup, and the history here is linear.
+    """
+    revisions, parents = set(), set()
+    for path in MIGRATIONS_DIR.glob("*.py"):
+        source = path.read_text()
+        revisions.update(_REVISION.findall(source))
+        parents.update(_DOWN_REVISION.findall(source))
+    heads = revisions - parents
+    if len(heads) != 1:
+        raise RuntimeError(f"Expected one migration head, found {sorted(heads)}")
+    return heads.pop()
+
+async def _current_revision(conn) -> Optional[str]:
+    try:
+        return (await conn.execute(text("SELECT version_num FROM alembic_version"))).scalar()
+    except DBAPIError:
+        # no alembic_version table: never migrated
+        return None
+
+def _upgrade(connection):
+    from alembic import command
+
+    command.upgrade(_alembic_config(connection), "head")
+
 async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+    """Make sure the schema matches the migrations before serving.
+
+    Schema changes are applied with `alembic upgrade head` as a deploy
+    step (the Procfile release phase, the Docker image's command); at
+    startup this only compares revisions. DB_AUTO_MIGRATE=1 runs
+    the upgrade here instead, for local development.
+    """
+    if get_settings().database.auto_migrate:
+        async with get_engine().begin() as conn:
+            await conn.run_sync(_upgrade)
+        return
+
+    async with get_engine().connect() as conn:
+        current = await _current_revision(conn)
+    head = migration_head()
+    if current != head:
+        raise RuntimeError(
+            f"Database schema is at revision {current}, the code expects {head}; "
+            "run `alembic upgrade head` (a database created before migrations "
+            "existed needs `alembic stamp 0001` first)"
+        )
+
+async def dispose_engines():
+    """Close pooled connections; the next get_engine() builds a fresh engine"""
+    for factory in (get_engine, get_replica_engine):
+        engine = factory() if factory.cache_info().currsize else None
+        if engine is not None:
+            await engine.dispose()
+    for factory in (get_engine, get_replica_engine, session_factory, read_session_factory):
+        factory.cache_clear()
@@ -0,0 +1,99 @@
+"""Engine and connection-pool configuration, driven by the environment.
+
+    DB_ECHO                  log every SQL statement (default false)
+    DB_POOL_SIZE             connections kept open per worker (default 10)
+    DB_MAX_OVERFLOW          extra connections allowed under burst (default 20)
+    DB_POOL_TIMEOUT          seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE          seconds before a connection is replaced (default 1800)
+    DB_POOL_PRE_PING         test connections on checkout (default true)
+    DB_STATEMENT_CACHE_SIZE  asyncpg prepared statements cached per connection (default 500)
+    DATABASE_REPLICA_URL     optional read replica for GET endpoints
+    DB_AUTO_MIGRATE          apply migrations at startup (development only)
+
+Replica reads may lag the primary; a read right after a write can
+re-cache the old row for up to RESPONSE_CACHE_TTL.
+"""
+import time
+from typing import Optional
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .config import DatabaseSettings
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.metrics.checkouts += 1
+            self.metrics.wait_seconds_total += waited
+            self.metrics.wait_seconds_max = max(self.metrics.wait_seconds_max, waited)
+
+
+def engine_kwargs(url: str, settings: DatabaseSettings) -> dict:
+    kwargs = {"echo": settings.echo, "future": True}
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        # aiosqlite picks its own NullPool/StaticPool; queue pool options don't apply
+        return kwargs
+
+    kwargs.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_recycle=settings.pool_recycle,
+        pool_pre_ping=settings.pool_pre_ping,
+    )
+    if make_url(url).get_driver_name() == "asyncpg":
+        kwargs["connect_args"] = {"prepared_statement_cache_size": settings.statement_cache_size}
+    return kwargs
+
+
+def build_engine(url: str, settings: DatabaseSettings) -> AsyncEngine:
+    return create_async_engine(url, **engine_kwargs(url, settings))
+
+
+def pool_stats(engine: Optional[AsyncEngine]) -> Optional[dict]:
+    if engine is None:
+        return None
+    pool = engine.sync_engine.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, InstrumentedQueuePool):
+        capacity = pool.size() + pool._max_overflow
+        m = pool.metrics
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=pool.overflow(),
+            saturation=pool.checkedout() / capacity if capacity > 0 else 0.0,
+            checkouts=m.checkouts,
+            checkout_timeouts=m.timeouts,
+            checkout_wait_seconds_avg=m.wait_seconds_total / m.checkouts if m.checkouts else 0.0,
+            checkout_wait_seconds_max=m.wait_seconds_max,
+        )
+    return stats
@@ -0,0 +1,36 @@
+"""Post previews for list endpoints.
+
+The excerpt, length and reading time are derived from the body when a
+post is written and stored with it, so listing posts never reads or
+ships the full body.
+"""
+import math
+import re
+from typing import Dict, Union
+
+EXCERPT_LENGTH = 280
+WORDS_PER_MINUTE = 200
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def make_excerpt(body: str, length: int = EXCERPT_LENGTH) -> str:
+    """First `length` characters of the body on one line, cut at a word boundary"""
+    text = _WHITESPACE.sub(" ", body).strip()
+    if len(text) <= length:
+        return text
+    cut = text[:length]
+    space = cut.rfind(" ")
+    if space > length // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,.;:-") + "…"
+
+
+def summary_fields(body: str) -> Dict[str, Union[str, int]]:
+    """Column values to store next to `body`"""
+    words = len(body.split())
+    return {
+        "excerpt": make_excerpt(body),
+        "body_length": len(body),
+        "reading_minutes": max(1, math.ceil(words / WORDS_PER_MINUTE)),
+    }
@@ -0,0 +1,173 @@
+"""Outbound mail queue.
+
+Request handlers only enqueue; a few worker tasks started from the app
+lifespan do the SMTP work, each over one connection that is reused across
+messages and reopened when the server drops it. Failed sends are retried
+with exponential backoff.
+
+For local testing point MAIL_SERVER/MAIL_PORT at a debugging server, e.g.
+`python -m aiosmtpd -n -l localhost:1025` with MAIL_STARTTLS=false and
+MAIL_USE_CREDENTIALS=false.
+"""
+import asyncio
+import logging
+import time
+from email.message import EmailMessage
+from typing import List, Optional
+
+import aiosmtplib
+
+from .config import SMTPSettings, get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class MailQueue:
+    def __init__(
+        self,
+        settings: SMTPSettings,
+        maxsize: int = 1000,
+        workers: int = 2,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        idle_timeout: float = 60.0,
+    ):
+        self.settings = settings
+        self.maxsize = maxsize
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self._send_seconds_total = 0.0
+        self._send_seconds_max = 0.0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"mail-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self, timeout: Optional[float] = 10.0):
+        """Give queued mail up to `timeout` seconds (None: as long as it takes) to go out, then cancel the workers"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, message: EmailMessage):
+        """Queue a message for sending; raises asyncio.QueueFull when saturated"""
+        if self._queue is None:
+            raise RuntimeError("Mail queue is not running")
+        self._queue.put_nowait(message)
+
+    async def put(self, message: EmailMessage):
+        """Queue a message, waiting for room; for bulk senders that want backpressure"""
+        if self._queue is None:
+            raise RuntimeError("Mail queue is not running")
+        await self._queue.put(message)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_capacity": self.maxsize,
+            "workers": len(self._tasks),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "send_seconds_avg": self._send_seconds_total / self.sent if self.sent else 0.0,
+            "send_seconds_max": self._send_seconds_max,
+        }
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        s = self.settings
+        smtp = aiosmtplib.SMTP(
+            hostname=s.server,
+            port=s.port,
+            use_tls=s.ssl_tls,
+            start_tls=s.starttls,
+            validate_certs=s.validate_certs,
+            timeout=s.timeout,
+        )
+        await smtp.connect()
+        if s.use_credentials:
+            await smtp.login(s.username, s.password)
+        return smtp
+
+    async def _close(self, smtp: Optional[aiosmtplib.SMTP]):
+        if smtp is None:
+            return
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    async def _worker(self):
+        smtp: Optional[aiosmtplib.SMTP] = None
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(self._queue.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    # Don't hold an idle connection the server will drop anyway
+                    await self._close(smtp)
+                    smtp = None
+                    continue
+
+                try:
+                    smtp = await self._deliver(smtp, message)
+                finally:
+                    self._queue.task_done()
+        finally:
+            await self._close(smtp)
+
+    async def _deliver(self, smtp: Optional[aiosmtplib.SMTP], message: EmailMessage):
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                if smtp is None or not smtp.is_connected:
+                    smtp = await self._connect()
+                await smtp.send_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self._close(smtp)
+                smtp = None
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    logger.error(
+                        "Email delivery failed",
+                        extra={"to": message["To"], "attempts": attempt + 1, "error": str(e)}
+                    )
+                    return smtp
+                self.retried += 1
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+            else:
+                elapsed = time.perf_counter() - started
+                self.sent += 1
+                self._send_seconds_total += elapsed
+                self._send_seconds_max = max(self._send_seconds_max, elapsed)
+                return smtp
+
+
+_settings = get_settings()
+mail_queue = MailQueue(
+    _settings.smtp,
+    maxsize=_settings.mail_queue_size,
+    workers=_settings.mail_workers,
+    max_retries=_settings.mail_max_retries,
+    backoff=_settings.mail_retry_backoff,
+)
@@ -1,16 +1,91 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-from .database import init_db
+from .config import get_settings
+from .logging_config import setup_logging, shutdown_logging, RequestIdMiddleware
+from .database import init_db, dispose_engines, get_engine, get_replica_engine, session_factory
+from .utils import hasher
+from .db_config import pool_stats
+from .metrics import registry, MetricsMiddleware
+from .cache import response_cache
+from .rate_limit import get_backend as rate_limit_backend
+from .compression import CompressionMiddleware
+from .mail_queue import mail_queue
+from .views import view_counter
+from .broadcast import broadcaster
+from .send_email import load_templates
 from .routes import blog_content, users, auth, password_reset1
 
+settings = get_settings()
+
+def _pool_stats():
+    return {"primary": pool_stats(get_engine()), "replica": pool_stats(get_replica_engine())}
+
+def _collect_runtime_stats():
+    mail = mail_queue.stats()
+    yield "mail_queue_depth", "gauge", "Messages waiting to be sent", {"": mail["queue_depth"]}
+    yield "mail_sent_total", "counter", "Messages delivered", {"": mail["sent"]}
+    yield "mail_failed_total", "counter", "Messages dropped after retries", {"": mail["failed"]}
+    yield "mail_send_seconds_avg", "gauge", "Average SMTP send time", {"": mail["send_seconds_avg"]}
+    yield "mail_send_seconds_max", "gauge", "Slowest SMTP send", {"": mail["send_seconds_max"]}
+
+    views = view_counter.stats()
+    yield "views_pending", "gauge", "Post views counted but not yet written", {"": views["pending_views"]}
+    yield "views_flushed_total", "counter", "Post views written to the database", {"": views["flushed_views"]}
+    yield "views_flush_failures_total", "counter", "View count flushes that failed", {"": views["flush_failures"]}
+
+    stream = broadcaster.stats()
+    yield "stream_subscribers", "gauge", "Open /blog/stream connections", {"": stream["subscribers"]}
+    yield "stream_events_delivered_total", "counter", "Events queued for stream subscribers", {"": stream["delivered"]}
+    yield "stream_evicted_total", "counter", "Stream subscribers dropped for falling behind", {"": stream["evicted"]}
+    yield "stream_publish_failures_total", "counter", "Events that could not be published", {"": stream["publish_failures"]}
+
+    pools = _pool_stats()
+    for key, help in (
+        ("checked_out", "Connections in use"),
+        ("overflow", "Connections opened beyond pool_size"),
+        ("saturation", "Checked-out share of pool_size + max_overflow"),
+        ("checkout_wait_seconds_avg", "Average wait for a pool connection"),
+        ("checkout_wait_seconds_max", "Longest wait for a pool connection"),
+        ("checkout_timeouts", "Checkouts that hit pool_timeout"),
+    ):
+        values = {f'{{engine="{name}"}}': stats[key] for name, stats in pools.items() if stats and key in stats}
+        if values:
+            yield f"db_pool_{key}", "gauge", help, values
+
+registry.add_collector(_collect_runtime_stats)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    await init_db()
-    yield
-    # Shutdown (nếu cần)
+    # Startup; logging is set up and shut down here so that every run of
+    # the app (tests, the load test) gets a listener for its own records
+    setup_logging()
+    try:
+        await init_db()
+        # Build the shared stores now, so a setup that cannot work with the
+        # configured number of workers fails (or warns) at startup
+        response_cache.start()
+        if settings.rate_limit_enabled:
+            rate_limit_backend()
+        registry.start()
+        await hasher.start()
+        load_templates()
+        mail_queue.start()
+        await view_counter.start(session_factory())
+        await broadcaster.start()
+        yield
+        # Shutdown: the server has stopped accepting requests and finished the
+        # in-flight ones by now
+        await broadcaster.stop()
+        await view_counter.stop()
+        await mail_queue.stop(timeout=settings.mail_drain_timeout)
+        hasher.shutdown()
+        await dispose_engines()
+        await registry.stop()
+    finally:
+        shutdown_logging()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -22,8 +97,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Request-ID"],
+    max_age=settings.cors_max_age,
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_min_size,
+    encodings=settings.compression_encodings,
+    cache_size=settings.compression_cache_size,
+)
+
+app.add_middleware(RequestIdMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(blog_content.router)
 app.include_router(users.router)
 app.include_router(auth.router)
@@ -31,4 +118,18 @@ app.include_router(password_reset1.router)
 
 @app.get("/")
 def get():
-    return {"msg": "Hello world"}
\ No newline at end of file
+    return {"msg": "Hello world"}
+
+@app.get("/health")
+def health():
+    return {
+        "status": "ok",
+        "mail": mail_queue.stats(),
+        "views": view_counter.stats(),
+        "stream": broadcaster.stats(),
+        "db": _pool_stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
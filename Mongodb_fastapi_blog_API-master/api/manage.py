@@ -0,0 +1,94 @@
+"""Maintenance commands.
+
+    python -m api.manage backfill-summaries [--batch-size 500]
+    python -m api.manage send-newsletter --subject "..." --content "..." [--batch-size 500]
+"""
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import bindparam, select, update
+
+from .database import dispose_engines, session_factory
+from .excerpts import summary_fields
+from .logging_config import setup_logging, shutdown_logging
+from .mail_queue import mail_queue
+from .models import BlogPost
+from .send_email import send_newsletter
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill_summaries(batch_size: int = 500) -> int:
+    """Fill excerpt/body_length/reading_minutes on posts written before they existed.
+
+    Walks the posts missing an excerpt in id order, one committed batch at a
+    time, so it can run against a live database and be resumed.
+    """
+    updated = 0
+    last_id = 0
+    statement = (
+        update(BlogPost.__table__)
+        .where(BlogPost.__table__.c.id == bindparam("post_id"))
+        .values(
+            excerpt=bindparam("excerpt"),
+            body_length=bindparam("body_length"),
+            reading_minutes=bindparam("reading_minutes"),
+        )
+    )
+    async with session_factory()() as db:
+        while True:
+            rows = (await db.execute(
+                select(BlogPost.id, BlogPost.body)
+                .where(BlogPost.excerpt.is_(None), BlogPost.id > last_id)
+                .order_by(BlogPost.id)
+                .limit(batch_size)
+            )).all()
+            if not rows:
+                break
+            await db.execute(statement, [{"post_id": id, **summary_fields(body)} for id, body in rows])
+            await db.commit()
+            updated += len(rows)
+            last_id = rows[-1].id
+            logger.info("Backfilled post summaries", extra={"updated": updated, "last_id": last_id})
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill = commands.add_parser("backfill-summaries", help="compute excerpts for existing posts")
+    backfill.add_argument("--batch-size", type=int, default=500)
+    newsletter = commands.add_parser("send-newsletter", help="mail a newsletter to every user")
+    newsletter.add_argument("--subject", required=True)
+    newsletter.add_argument("--content", required=True)
+    newsletter.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_logging()
+
+    async def run():
+        try:
+            if args.command == "backfill-summaries":
+                count = await backfill_summaries(args.batch_size)
+                print(f"Backfilled {count} posts")
+            elif args.command == "send-newsletter":
+                mail_queue.start()
+                try:
+                    count = await send_newsletter(session_factory(), args.subject, args.content, args.batch_size)
+                finally:
+                    # Wait for everything queued to go out (or fail its retries)
+                    await mail_queue.stop(timeout=None)
+                stats = mail_queue.stats()
+                print(f"Queued {count} newsletters: {stats['sent']} sent, {stats['failed']} failed")
+        finally:
+            await dispose_engines()
+
+    try:
+        asyncio.run(run())
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
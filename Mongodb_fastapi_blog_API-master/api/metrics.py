@@ -0,0 +1,271 @@
+"""In-process metrics exposed in the Prometheus text format on /metrics.
+
+Recording is a dict lookup plus a bisect, cheap enough for every request.
+
+With several workers behind one port a scrape lands on any of them, so
+each worker also writes its values to METRICS_DIR every
+METRICS_FLUSH_INTERVAL seconds (and its final values on shutdown), and
+/metrics serves the values of all workers: counters and histograms
+summed, gauges with a pid label per running worker. Other workers' values
+are up to METRICS_FLUSH_INTERVAL old.
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _with_label(sample: str, label: str) -> str:
+    if sample.endswith("}"):
+        return sample[:-1] + "," + label + "}"
+    return sample + "{" + label + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name + _labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        self._values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        for labels, series in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield self.name + "_bucket" + _labels(self.labelnames, labels, f'le="{bound}"'), cumulative
+            cumulative += series[len(self.buckets)]
+            yield self.name + "_bucket" + _labels(self.labelnames, labels, 'le="+Inf"'), cumulative
+            yield self.name + "_sum" + _labels(self.labelnames, labels), series[-1]
+            yield self.name + "_count" + _labels(self.labelnames, labels), cumulative
+
+
+class Registry:
+    def __init__(self, directory: Optional[str] = None, flush_interval: float = 5.0):
+        self._metrics = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, float]]]]] = []
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """Register a callable returning (name, kind, help, {label_suffix: value}) tuples at scrape time"""
+        self._collectors.append(collector)
+
+    def families(self):
+        """(name, kind, help, [(sample, value)]) for this worker"""
+        for metric in self._metrics:
+            yield metric.name, metric.kind, metric.help, list(metric.samples())
+        for collector in self._collectors:
+            for name, kind, help, values in collector():
+                yield name, kind, help, [(name + labels, value) for labels, value in values.items()]
+
+    def write(self, live: bool = True):
+        """Publish this worker's values to the metrics directory; a stopped worker's gauges are left out"""
+        families = [list(family) for family in self.families() if live or family[1] != "gauge"]
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(families, f)
+        os.replace(path + ".tmp", path)
+
+    def _all_workers(self):
+        self.write()
+        merged: Dict[str, list] = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.json"))):
+            pid = os.path.basename(path)[:-len(".json")]
+            try:
+                with open(path) as f:
+                    families = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, kind, help, samples in families:
+                values = merged.setdefault(name, [kind, help, {}])[2]
+                for sample, value in samples:
+                    if kind == "gauge":
+                        values[_with_label(sample, f'pid="{pid}"')] = value
+                    else:
+                        values[sample] = values.get(sample, 0) + value
+        for name, (kind, help, values) in merged.items():
+            yield name, kind, help, list(values.items())
+
+    def render(self) -> str:
+        lines = []
+        for name, kind, help, samples in (self._all_workers() if self.directory else self.families()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{sample} {value}" for sample, value in samples)
+        return "\n".join(lines) + "\n"
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.write()
+            except OSError:
+                logger.warning("Writing metrics failed", exc_info=True)
+
+    def start(self):
+        if self.directory is None or self._task is not None:
+            return
+        self.write()
+        self._task = asyncio.create_task(self._run(), name="metrics-write")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self.write(live=False)
+
+
+_settings = get_settings()
+registry = Registry(_settings.metrics_dir, _settings.metrics_flush_interval)
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+))
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served"
+))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time", ("operation",)
+))
+auth_duration = registry.register(Histogram(
+    "auth_duration_seconds", "Time spent authenticating a request", ("stage",)
+))
+rate_limited = registry.register(Counter(
+    "rate_limited_total", "Requests rejected by a rate limit", ("limit",)
+))
+serialize_duration = registry.register(Histogram(
+    "serialize_duration_seconds", "Time spent serializing response bodies", ("endpoint",)
+))
+
+
+class MetricsMiddleware:
+    """Per-route, per-status latency and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths = None
+
+    def _route_path(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._route_paths is None:
+            # Label by route template, not raw path, to keep cardinality bounded
+            self._route_paths = {
+                getattr(route, "endpoint", None): route.path for route in scope["app"].routes
+            }
+        return self._route_paths.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            http_request_duration.observe(
+                time.perf_counter() - start, scope["method"], self._route_path(scope), str(status_code)
+            )
+
+
+def instrument_engine(engine: AsyncEngine):
+    """Time every statement executed through the engine"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        db_query_duration.observe(time.perf_counter() - started, operation)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Index
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 from .database import Base
 
@@ -12,16 +12,71 @@ class User(Base):
     password = Column(String(255), nullable=False)
     api_key = Column(String(100))
     
-    blog_posts = relationship("BlogPost", back_populates="author", cascade="all, delete-orphan")
+    # lazy="raise": an implicit lazy load can't run under asyncio (MissingGreenlet)
+    # and would be one query per user; load posts with an explicit query instead
+    blog_posts = relationship(
+        "BlogPost",
+        back_populates="author",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="raise"
+    )
 
 class BlogPost(Base):
     __tablename__ = "blog_posts"
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
-    body = Column(Text, nullable=False)
+    # List endpoints read the precomputed preview columns below; the body is
+    # only loaded when asked for (undefer), and loading it by accident raises
+    body = deferred(Column(Text, nullable=False), raiseload=True)
+    excerpt = Column(String(300))
+    body_length = Column(Integer)
+    reading_minutes = Column(Integer)
+    # Written in batches by api/views.py, never in the request path
+    views = Column(BigInteger, nullable=False, default=0, server_default="0")
     author_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     author_name = Column(String(100))
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Set by edits; with created_at it is the post's Last-Modified
+    updated_at = Column(DateTime)
     
-    author = relationship("User", back_populates="blog_posts")
\ No newline at end of file
+    author = relationship("User", back_populates="blog_posts", lazy="raise")
+    
+    __table_args__ = (
+        # Keyset pagination for the feed: ORDER BY created_at DESC, id DESC
+        Index("ix_blog_posts_created_at_id", created_at.desc(), id.desc()),
+        # Per-author listing: WHERE author_id = ? ORDER BY created_at DESC, id DESC
+        Index("ix_blog_posts_author_created_at_id", author_id, created_at.desc(), id.desc()),
+        # Popular posts: ORDER BY views DESC, id DESC LIMIT k
+        Index("ix_blog_posts_views_id", views.desc(), id.desc()),
+    )
+
+class Tag(Base):
+    __tablename__ = "tags"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), unique=True, nullable=False)
+    # Adjusted by api/tags.py in the same transaction as post_tags, never counted
+    post_count = Column(Integer, nullable=False, default=0, server_default="0")
+    
+    __table_args__ = (
+        # Tag cloud: ORDER BY post_count DESC, name LIMIT n
+        Index("ix_tags_post_count_name", post_count.desc(), name),
+    )
+
+class PostTag(Base):
+    __tablename__ = "post_tags"
+    
+    # Checked at commit, without cascade: deleting a post removes these rows
+    # itself (api/tags.py), after the ownership-checked DELETE; deleting a
+    # user, through the users_untag_posts trigger (migration 0008)
+    post_id = Column(Integer, ForeignKey("blog_posts.id", deferrable=True, initially="DEFERRED"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True)
+    # Copy of the post's created_at, so a tag's feed never reads other posts
+    created_at = Column(DateTime, nullable=False)
+    
+    __table_args__ = (
+        # Feed by tag: WHERE tag_id = ? ORDER BY created_at DESC, post_id DESC
+        Index("ix_post_tags_tag_created_at_post", tag_id, created_at.desc(), post_id.desc()),
+    )
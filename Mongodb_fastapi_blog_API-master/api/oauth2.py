@@ -5,20 +5,31 @@ from fastapi import Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from dotenv import load_dotenv
-import os
 
-load_dotenv()
-
-from .schemas import TokenData
+from .config import get_settings
+from .schemas import TokenData, CurrentUser
 from .database import get_db
 from .models import User
+from .cache import TTLCache
+from .metrics import auth_duration
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='login')
 
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+settings = get_settings()
+
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+
+# Users resolved from a valid token are cached per worker so authenticated
+# requests don't pay a SELECT on users every time
+USER_CACHE_TTL = settings.user_cache_ttl
+USER_CACHE_SIZE = settings.user_cache_size
+# Opt-in: trust the name/email claims of the token and never touch the DB.
+# Changes to a user then only show up once their token is reissued.
+AUTH_STATELESS = settings.auth_stateless
+
+_user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
 
 def create_access_token(payload: Dict):
     to_encode = payload.copy()
@@ -33,27 +44,42 @@ def verify_access_token(token: str, credential_exception: Dict):
         id: int = payload.get("id")
         if not id:
             raise credential_exception
-        token_data = TokenData(id=id)
+        token_data = TokenData(id=id, name=payload.get("name"), email=payload.get("email"))
         return token_data
     except JWTError:
         raise credential_exception
 
+def invalidate_user(user_id: int):
+    """Drop a cached user; call after any change to their row"""
+    _user_cache.delete(user_id)
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db)
-):
+) -> CurrentUser:
     credential_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not verify token, token expired",
         headers={"WWW-AUTHENTICATE": "Bearer"}
     )
     
-    token_data = verify_access_token(token=token, credential_exception=credential_exception)
+    with auth_duration.time("jwt_decode"):
+        token_data = verify_access_token(token=token, credential_exception=credential_exception)
+    
+    if AUTH_STATELESS and token_data.name and token_data.email:
+        return CurrentUser(id=token_data.id, name=token_data.name, email=token_data.email)
+    
+    current_user = _user_cache.get(token_data.id)
+    if current_user is not None:
+        return current_user
     
-    result = await db.execute(select(User).where(User.id == token_data.id))
-    current_user = result.scalar_one_or_none()
+    with auth_duration.time("user_lookup"):
+        result = await db.execute(select(User).where(User.id == token_data.id))
+        user = result.scalar_one_or_none()
     
-    if not current_user:
+    if not user:
         raise credential_exception
     
-    return current_user
\ No newline at end of file
+    current_user = CurrentUser.model_validate(user)
+    _user_cache.set(token_data.id, current_user)
+    return current_user
@@ -0,0 +1,52 @@
+import base64
+import json
+from datetime import datetime
+from typing import List, Tuple
+
+from fastapi import HTTPException, status
+
+MAX_PAGE_SIZE = 100
+
+
+def _encode(values: List) -> str:
+    raw = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> List:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def _invalid_cursor():
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid pagination cursor"
+    )
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """Encode the (created_at, id) keyset position of the last row of a page"""
+    return _encode([created_at.isoformat(), id])
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor, 400 on anything else"""
+    try:
+        created_at, id = _decode(cursor)
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, TypeError):
+        raise _invalid_cursor()
+
+
+def encode_rank_cursor(rank: float, id: int) -> str:
+    """Encode the (rank, id) keyset position of the last search result of a page"""
+    return _encode([rank, id])
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        rank, id = _decode(cursor)
+        return float(rank), int(id)
+    except (ValueError, TypeError):
+        raise _invalid_cursor()
@@ -0,0 +1,242 @@
+"""Token-bucket rate limiting for the unauthenticated, expensive routes.
+
+A limit such as "5/minute" is a bucket of 5 tokens refilled at 5 per
+minute; every request takes one, and a request that finds the bucket
+empty gets a 429 with Retry-After. Limits are FastAPI dependencies on the
+route, so they run before the handler opens a database session, looks up
+a user or hashes a password.
+
+Buckets live in a per-worker sharded memory store by default. With
+several workers each one enforces the limit separately, which multiplies
+every limit by the number of workers (logged at startup); point
+RATE_LIMIT_URL at Redis to share the buckets instead.
+"""
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from .config import get_settings
+from .metrics import rate_limited
+
+logger = logging.getLogger(__name__)
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_RATE = re.compile(r"^\s*(\d+)\s*/\s*(second|minute|hour|day)s?\s*$")
+
+
+class Rate(NamedTuple):
+    capacity: int
+    period: float
+
+    @classmethod
+    def parse(cls, value: str) -> "Rate":
+        """'10/minute' -> Rate(10, 60.0)"""
+        match = _RATE.match(value)
+        if match is None:
+            raise ValueError(f"Invalid rate limit {value!r}, expected e.g. '10/minute'")
+        return cls(int(match.group(1)), float(_PERIODS[match.group(2)]))
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity / self.period
+
+
+class RateLimitBackend:
+    """Interface for bucket stores"""
+
+    async def hit(self, key: str, rate: Rate) -> Tuple[bool, float]:
+        """Take a token from the bucket; return (allowed, seconds until one is available)"""
+        raise NotImplementedError
+
+
+class _Shard:
+    __slots__ = ("lock", "buckets")
+
+    def __init__(self):
+        self.lock = Lock()
+        # key -> (tokens, updated_at, full_at), oldest update first
+        self.buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Buckets in this process, spread over shards with their own locks.
+
+    A bucket is only stored while it is below capacity: once it would have
+    refilled it is dropped, since a missing bucket means a full one. Each
+    hit first drops the expired buckets at the old end of its shard, and a
+    shard that still grows past `max_keys` loses its least recently used
+    bucket (which resets that key's limit).
+    """
+
+    def __init__(self, shards: int = 16, max_keys: int = 100_000):
+        self._shards = [_Shard() for _ in range(shards)]
+        self._max_keys_per_shard = max(1, max_keys // shards)
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    async def hit(self, key: str, rate: Rate) -> Tuple[bool, float]:
+        now = time.monotonic()
+        refill = rate.refill_per_second
+        shard = self._shard(key)
+        with shard.lock:
+            buckets = shard.buckets
+            while buckets:
+                oldest = next(iter(buckets.values()))
+                if oldest[2] > now:
+                    break
+                buckets.popitem(last=False)
+
+            entry = buckets.pop(key, None)
+            if entry is None:
+                tokens = float(rate.capacity)
+            else:
+                tokens = min(rate.capacity, entry[0] + (now - entry[1]) * refill)
+
+            if tokens < 1:
+                buckets[key] = (tokens, now, now + (rate.capacity - tokens) / refill)
+                return False, (1 - tokens) / refill
+
+            tokens -= 1
+            buckets[key] = (tokens, now, now + (rate.capacity - tokens) / refill)
+            if len(buckets) > self._max_keys_per_shard:
+                buckets.popitem(last=False)
+            return True, 0.0
+
+    def __len__(self) -> int:
+        return sum(len(shard.buckets) for shard in self._shards)
+
+
+# KEYS[1] bucket key; ARGV: capacity, refill per second, now (seconds)
+_REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local refill = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+if tokens == nil then
+  tokens = capacity
+else
+  tokens = math.min(capacity, tokens + (now - tonumber(state[2])) * refill)
+end
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / refill * 1000) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Buckets shared by all workers, updated atomically by a Lua script"""
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self._client = client
+        self._prefix = prefix
+        self._script = client.register_script(_REDIS_TOKEN_BUCKET)
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisRateLimitBackend":
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_URL points to redis but the redis package is not installed")
+        return cls(redis.from_url(url))
+
+    async def hit(self, key: str, rate: Rate) -> Tuple[bool, float]:
+        refill = rate.refill_per_second
+        allowed, tokens = await self._script(
+            keys=[self._prefix + key], args=[rate.capacity, refill, time.time()]
+        )
+        if allowed:
+            return True, 0.0
+        return False, (1 - float(tokens)) / refill
+
+
+def _build_backend() -> RateLimitBackend:
+    settings = get_settings()
+    url = settings.rate_limit_url
+    if url.startswith(("redis://", "rediss://")):
+        return RedisRateLimitBackend.from_url(url)
+    if settings.web_concurrency > 1:
+        logger.warning(
+            "Rate limits are per worker: each limit allows %d times its rate; set RATE_LIMIT_URL "
+            "to a redis:// URL to share them", settings.web_concurrency
+        )
+    return MemoryRateLimitBackend(shards=settings.rate_limit_shards, max_keys=settings.rate_limit_max_keys)
+
+
+_backend: Optional[RateLimitBackend] = None
+
+
+def get_backend() -> RateLimitBackend:
+    global _backend
+    if _backend is None:
+        _backend = _build_backend()
+    return _backend
+
+
+# Key functions: what a bucket is counted per. Returning None skips the limit.
+
+KeyFunc = Callable[[Request], Awaitable[Optional[str]]]
+
+
+async def client_ip(request: Request) -> Optional[str]:
+    # behind a proxy listed in FORWARDED_ALLOW_IPS, uvicorn's proxy_headers
+    # already put the real client here
+    return request.client.host if request.client else None
+
+
+def form_field(name: str) -> KeyFunc:
+    async def key(request: Request) -> Optional[str]:
+        value = (await request.form()).get(name)
+        return value.strip().lower() if isinstance(value, str) and value.strip() else None
+    return key
+
+
+def json_field(name: str) -> KeyFunc:
+    async def key(request: Request) -> Optional[str]:
+        try:
+            body = await request.json()
+        except ValueError:
+            return None
+        value = body.get(name) if isinstance(body, dict) else None
+        return value.strip().lower() if isinstance(value, str) and value.strip() else None
+    return key
+
+
+class RateLimit:
+    """Route dependency enforcing one or more (key function, rate) buckets.
+
+        @router.post("", dependencies=[Depends(RateLimit("login", [(client_ip, "30/minute")]))])
+    """
+
+    def __init__(self, name: str, limits: List[Tuple[KeyFunc, str]]):
+        self.name = name
+        self.limits = [(key_func, Rate.parse(rate)) for key_func, rate in limits]
+
+    async def __call__(self, request: Request):
+        if not get_settings().rate_limit_enabled:
+            return
+        backend = get_backend()
+        for index, (key_func, rate) in enumerate(self.limits):
+            key = await key_func(request)
+            if key is None:
+                continue
+            allowed, retry_after = await backend.hit(f"{self.name}:{index}:{key}", rate)
+            if not allowed:
+                rate_limited.inc(self.name)
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many requests, try again later",
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+                )
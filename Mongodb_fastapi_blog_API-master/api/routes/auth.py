@@ -1,20 +1,28 @@
 from fastapi import APIRouter, Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 
 from ..schemas import Token
 from ..database import get_db
 from ..models import User
 from .. import utils
 from .. import oauth2
+from ..config import get_settings
+from ..rate_limit import RateLimit, client_ip, form_field
 
 router = APIRouter(
     prefix="/login",
     tags=["Authentication"]
 )
 
-@router.post("", response_model=Token, status_code=status.HTTP_200_OK)
+# Per IP against credential stuffing, per username against guessing one account
+login_limit = RateLimit("login", [
+    (client_ip, get_settings().rate_limit_login_ip),
+    (form_field("username"), get_settings().rate_limit_login_user),
+])
+
+@router.post("", response_model=Token, status_code=status.HTTP_200_OK, dependencies=[Depends(login_limit)])
 async def login(
     user_credentials: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db)
@@ -23,8 +31,21 @@ async def login(
     result = await db.execute(select(User).where(User.name == user_credentials.username))
     user = result.scalar_one_or_none()
 
-    if user and utils.verify_password(user_credentials.password, user.password):
-        access_token = oauth2.create_access_token(payload={"id": user.id})
+    if user:
+        verified, new_hash = await utils.hasher.verify_and_update_async(
+            user_credentials.password, user.password
+        )
+    else:
+        verified, new_hash = await utils.hasher.verify_unknown_async(user_credentials.password)
+
+    if verified:
+        if new_hash:
+            # Transparently move legacy/outdated hashes to the current scheme
+            await db.execute(update(User).where(User.id == user.id).values(password=new_hash))
+            await db.commit()
+        access_token = oauth2.create_access_token(
+            payload={"id": user.id, "name": user.name, "email": user.email}
+        )
         return {"access_token": access_token, "token_type": "bearer"}
     else:
         raise HTTPException(
@@ -1,121 +1,481 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+import asyncio
+import logging
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response, WebSocket
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select, insert, update, delete, desc, tuple_
+from sqlalchemy.orm import undefer
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
-from ..schemas import BlogContent, BlogContentResponse
-from ..database import get_db
-from ..models import User, BlogPost
+from ..schemas import (
+    BlogContent, BlogContentResponse, BlogPostSummary, PopularPost, CurrentUser, SearchResult,
+    BulkImportError, BulkImportResult, TagCount, MAX_TAG_LENGTH
+)
+from ..database import get_db, get_read_db, read_session_factory
+from ..models import BlogPost, PostTag, Tag
+from ..pagination import MAX_PAGE_SIZE, encode_cursor, decode_cursor, encode_rank_cursor, decode_rank_cursor
+from ..search import search_posts, index_post, unindex_post
+from ..cache import TTLCache, response_cache, make_entry, conditional_response, http_date
+from ..metrics import serialize_duration
+from ..serializers import (
+    POST_COLUMNS, post_select, summary_select, fetch_post, dump_post, dump_post_row, dump_summaries,
+    dump_summary, dump_popular, dump_tag_counts, last_modified, post_response
+)
+from ..views import view_counter
+from ..broadcast import broadcaster, TooManySubscribers
+from ..config import get_settings
+from ..excerpts import summary_fields
+from ..tags import (
+    add_post_tags, set_post_tags, remove_post_tags, post_tag_names, posts_tag_names, tag_cloud_select
+)
 from .. import oauth2
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/blog",
     tags=["Blog Content"]
 )
 
+BULK_BATCH_SIZE = 500
+BULK_MAX_LINE_BYTES = 1024 * 1024
+BULK_MAX_REPORTED_ERRORS = 1000
+EXPORT_BATCH_SIZE = 1000
+
+# The ranking is per worker, so its pages are cached per worker rather than
+# in the shared response cache
+_popular_pages = TTLCache(maxsize=MAX_PAGE_SIZE, ttl=60)
+async def _missing_or_forbidden(db: AsyncSession, id: int):
+    # Only reached when a conditional UPDATE/DELETE matched nothing
+    result = await db.execute(select(BlogPost.author_id).where(BlogPost.id == id))
+    if result.first() is None:
+        return HTTPException(status_code=404, detail=f"Blog Post {id} not found")
+    return HTTPException(status_code=403, detail="You are not the owner of this blog post")
+
+async def _post_changed(id: int, post: Optional[BlogPost] = None, created: bool = False, tags_changed: bool = False):
+    # Drop the cached post and every cached feed page that may contain it,
+    # then tell stream subscribers; `post` is the new state, None when it was deleted
+    await response_cache.delete(f"post:{id}")
+    await response_cache.invalidate_namespace("feed")
+    if tags_changed:
+        await response_cache.invalidate_namespace("tags")
+    if post is not None:
+        index_post(post)
+        await broadcaster.publish("post.created" if created else "post.updated", dump_summary(post))
+    else:
+        unindex_post(id)
+        view_counter.forget(id)
+        await broadcaster.publish("post.deleted", b'{"id":%d}' % id)
+
 @router.post("/", response_model=BlogContentResponse)
 async def create_blog_post(
     blog_content: BlogContent,
-    current_user: User = Depends(oauth2.get_current_user),
+    current_user: CurrentUser = Depends(oauth2.get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     try:
-        new_post = BlogPost(
-            title=blog_content.title,
-            body=blog_content.body,
-            author_id=current_user.id,
-            author_name=current_user.name,
-            created_at=datetime.utcnow()
+        # id comes back through RETURNING, no refresh SELECT needed
+        result = await db.execute(
+            insert(BlogPost)
+            .values(
+                title=blog_content.title,
+                body=blog_content.body,
+                **summary_fields(blog_content.body),
+                author_id=current_user.id,
+                author_name=current_user.name,
+                created_at=datetime.utcnow()
+            )
+            .returning(BlogPost)
+            .options(undefer(BlogPost.body))
         )
-        
-        db.add(new_post)
+        new_post = result.scalar_one()
+        tagged = await add_post_tags(db, [(new_post.id, new_post.created_at, blog_content.tags)])
         await db.commit()
-        await db.refresh(new_post)
+        await _post_changed(new_post.id, new_post, created=True, tags_changed=tagged)
         
-        return new_post
-    except Exception as e:
-        print(e)
+        return post_response(new_post, blog_content.tags)
+    except Exception:
+        logger.exception("create_blog_post failed")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@router.get("/", response_model=List[BlogContentResponse])
+def _feed_query(tag: Optional[str]):
+    """Newest first, with the (created_at, id) pair to page on"""
+    if not tag:
+        # Keyset pagination over ix_blog_posts_created_at_id
+        return summary_select().order_by(desc(BlogPost.created_at), desc(BlogPost.id)), BlogPost.created_at, BlogPost.id
+    # One tag's posts: a range scan of ix_post_tags_tag_created_at_post, joined by primary key
+    query = (
+        summary_select()
+        .join(PostTag, PostTag.post_id == BlogPost.id)
+        .where(PostTag.tag_id == select(Tag.id).where(Tag.name == tag).scalar_subquery())
+        .order_by(desc(PostTag.created_at), desc(PostTag.post_id))
+    )
+    return query, PostTag.created_at, PostTag.post_id
+
+@router.get("/", response_model=List[BlogPostSummary])
 async def get_blog_posts(
-    limit: int = 4,
+    request: Request,
+    limit: int = Query(4, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    tag: Optional[str] = Query(None, max_length=MAX_TAG_LENGTH),
+    db: AsyncSession = Depends(get_read_db)
+):
+    tag = tag.strip().lower() if tag else None
+    generation = await response_cache.generation("feed")
+    key = f"feed:{generation}:{tag or ''}:{limit}:{after or ''}"
+    entry = await response_cache.get(key)
+    if entry is None:
+        # The cursor is the (created_at, id) of the last post of the previous page
+        query, created_at_column, id_column = _feed_query(tag)
+        if after:
+            created_at, last_id = decode_cursor(after)
+            query = query.where(tuple_(created_at_column, id_column) < (created_at, last_id))
+
+        try:
+            result = await db.execute(query.limit(limit))
+            blog_posts = result.all()
+        except Exception:
+            logger.exception("get_blog_posts failed")
+            raise HTTPException(status_code=500, detail="Internal server error")
+
+        headers = {}
+        if len(blog_posts) == limit:
+            last = blog_posts[-1]
+            headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.id)
+        with serialize_duration.time("get_blog_posts"):
+            body = dump_summaries(blog_posts)
+        entry = make_entry(body, headers)
+        await response_cache.set(key, entry)
+
+    return conditional_response(request, entry)
+
+async def _ndjson_lines(request: Request):
+    """Yield (line number, raw line) from a streamed NDJSON body"""
+    buffer = b""
+    number = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            yield number, line
+        if len(buffer) > BULK_MAX_LINE_BYTES:
+            raise HTTPException(status_code=413, detail=f"Line {number + 1} is too long")
+    if buffer:
+        yield number + 1, buffer
+
+def _bulk_failure(result: BulkImportResult, line: int, error: str):
+    # Past the reporting limit failures are only counted
+    result.failed += 1
+    if len(result.errors) < BULK_MAX_REPORTED_ERRORS:
+        result.errors.append(BulkImportError(line=line, error=error))
+    else:
+        result.errors_truncated = True
+
+async def _insert_batch(db: AsyncSession, batch: List[tuple], result: BulkImportResult):
+    """Insert one chunk in its own transaction; on failure retry row by row to pinpoint bad rows.
+
+    Cached pages are invalidated as soon as the chunk is committed, so an
+    upload that fails or is dropped later leaves no stale feed behind.
+    """
+    statement = insert(BlogPost).returning(*POST_COLUMNS, sort_by_parameter_order=True)
+    tagged = False
+    try:
+        rows = (await db.execute(statement, [values for _, values, _ in batch])).all()
+        tagged = await add_post_tags(db, [(row.id, row.created_at, tags) for row, (_, _, tags) in zip(rows, batch)])
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        rows, tagged = [], False
+        for number, values, tags in batch:
+            try:
+                row = (await db.execute(statement, [values])).one()
+                row_tagged = await add_post_tags(db, [(row.id, row.created_at, tags)])
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.warning("Bulk import row rejected by the database",
+                               extra={"line": number, "error": str(getattr(e, "orig", e))})
+                _bulk_failure(result, number, "Could not be stored")
+                continue
+            rows.append(row)
+            tagged = tagged or row_tagged
+    if rows:
+        await response_cache.invalidate_namespace("feed")
+    if tagged:
+        await response_cache.invalidate_namespace("tags")
+    result.inserted += len(rows)
+    for row in rows:
+        index_post(row)
+
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_import_blog_posts(
+    request: Request,
+    current_user: CurrentUser = Depends(oauth2.get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
+    """Import posts from an NDJSON body, one BlogContent object per line"""
+    result = BulkImportResult(inserted=0, failed=0, errors=[])
+    batch: List[tuple] = []
+
+    async for number, line in _ndjson_lines(request):
+        if not line.strip():
+            continue
+        try:
+            content = BlogContent.model_validate_json(line)
+        except ValidationError as e:
+            _bulk_failure(result, number, str(e))
+            continue
+        batch.append((number, {
+            "title": content.title,
+            "body": content.body,
+            **summary_fields(content.body),
+            "author_id": current_user.id,
+            "author_name": current_user.name,
+            "created_at": datetime.utcnow(),
+        }, content.tags))
+        if len(batch) >= BULK_BATCH_SIZE:
+            await _insert_batch(db, batch, result)
+            batch = []
+    if batch:
+        await _insert_batch(db, batch, result)
+    return result
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_blog_posts(current_user: CurrentUser = Depends(oauth2.get_current_user)):
+    """Stream every post as NDJSON with its tags, oldest first, from a server-side cursor"""
+    async def lines():
+        # The session lives as long as the stream, not the request handler
+        async with read_session_factory()() as db:
+            result = await db.stream(
+                select(*POST_COLUMNS)
+                .order_by(BlogPost.id)
+                .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+            async for rows in result.partitions():
+                # One query for the tags of each batch, so the export can be imported back as is
+                tags = await posts_tag_names(db, [row.id for row in rows])
+                yield b"".join(dump_post_row(row, tags.get(row.id, [])) + b"\n" for row in rows)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/popular", response_model=List[PopularPost])
+async def popular_blog_posts(
+    request: Request,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Most viewed posts: ranked in memory, then up to `limit` rows fetched by id"""
+    generation = await response_cache.generation("feed")
+    key = (view_counter.version, generation, limit)
+    entry = _popular_pages.get(key)
+    if entry is None:
+        ranking = view_counter.popular(limit)
+        posts = []
+        if ranking:
+            result = await db.execute(summary_select().where(BlogPost.id.in_([id for id, _ in ranking])))
+            rows = {row.id: row for row in result.all()}
+            posts = [{**rows[id]._asdict(), "views": views} for id, views in ranking if id in rows]
+        with serialize_duration.time("popular_blog_posts"):
+            entry = make_entry(dump_popular(posts))
+        _popular_pages.set(key, entry)
+
+    return conditional_response(request, entry)
+
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_blog_posts():
+    """Server-Sent Events: post.created and post.updated carry the post summary, post.deleted its id"""
+    if broadcaster.full:
+        raise HTTPException(status_code=503, detail="Too many stream subscribers, retry later")
+
+    async def frames():
+        # Subscribed only once the body is being sent: a client that leaves
+        # before that never runs this generator, so nothing is left behind
+        try:
+            subscriber = broadcaster.subscribe()
+        except TooManySubscribers:
+            # filled up since the check above; EventSource reconnects
+            return
+        try:
+            yield b"retry: 3000\n\n"
+            async for event in subscriber.events(get_settings().broadcast_heartbeat):
+                # comment lines keep proxies from timing out an idle stream
+                yield event.sse if event is not None else b": ping\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _close_on_disconnect(websocket: WebSocket, subscriber):
+    # Clients send nothing; reading only tells us when they leave
     try:
-        result = await db.execute(
-            select(BlogPost).order_by(desc(BlogPost.created_at)).limit(limit)
-        )
-        blog_posts = result.scalars().all()
-        return blog_posts
-    except Exception as e:
-        print(e)
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        subscriber.close()
+
+@router.websocket("/stream/ws")
+async def stream_blog_posts_ws(websocket: WebSocket):
+    """The /stream events as {"event": ..., "data": ...} text messages"""
+    try:
+        subscriber = broadcaster.subscribe()
+    except TooManySubscribers:
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+    reader = asyncio.create_task(_close_on_disconnect(websocket, subscriber))
+    try:
+        async for event in subscriber.events():
+            await websocket.send_text(event.text)
+        if not reader.done():
+            # evicted as a slow consumer, or the server is stopping
+            await websocket.close(code=1013)
+    finally:
+        reader.cancel()
+        broadcaster.unsubscribe(subscriber)
+
+@router.get("/tags", response_model=List[TagCount])
+async def tag_cloud(
+    request: Request,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Most used tags with their post counts"""
+    generation = await response_cache.generation("tags")
+    key = f"tags:{generation}:{limit}"
+    entry = await response_cache.get(key)
+    if entry is None:
+        result = await db.execute(tag_cloud_select(limit))
+        entry = make_entry(dump_tag_counts(result.all()))
+        await response_cache.set(key, entry)
+
+    return conditional_response(request, entry)
+
+@router.get("/search", response_model=List[SearchResult])
+async def search_blog_posts(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    position = decode_rank_cursor(after) if after else None
+    try:
+        results = await search_posts(db, q, limit, position)
+    except Exception:
+        logger.exception("search_blog_posts failed")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+    if len(results) == limit:
+        last = results[-1]
+        response.headers["X-Next-Cursor"] = encode_rank_cursor(last["rank"], last["id"])
+    return results
+
 @router.get("/{id}", response_model=BlogContentResponse)
-async def get_blog_post(id: int, db: AsyncSession = Depends(get_db)):
-    try:
-        result = await db.execute(select(BlogPost).where(BlogPost.id == id))
-        blog_post = result.scalar_one_or_none()
+async def get_blog_post(id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
+    key = f"post:{id}"
+    entry = await response_cache.get(key)
+    if entry is None:
+        try:
+            result = await db.execute(post_select().where(BlogPost.id == id))
+            blog_post = fetch_post(result)
+            tags = await post_tag_names(db, id) if blog_post else []
+        except Exception:
+            logger.exception("get_blog_post failed")
+            raise HTTPException(status_code=500, detail="Internal server error")
         
         if not blog_post:
             raise HTTPException(status_code=404, detail=f"Blog Post {id} not found")
         
-        return blog_post
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(e)
-        raise HTTPException(status_code=500, detail="Internal server error")
+        with serialize_duration.time("get_blog_post"):
+            body = dump_post(blog_post, tags)
+        entry = make_entry(body, {"Last-Modified": http_date(last_modified(blog_post))})
+        await response_cache.set(key, entry)
+
+    # Counted in memory, written by the view counter's next flush
+    view_counter.record(id)
+    return conditional_response(request, entry)
 
 @router.put("/{id}", response_model=BlogContentResponse)
 async def update_blog_post(
     id: int,
     blog_content: BlogContent,
-    current_user: User = Depends(oauth2.get_current_user),
+    current_user: CurrentUser = Depends(oauth2.get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(select(BlogPost).where(BlogPost.id == id))
-    blog_post = result.scalar_one_or_none()
-    
-    if not blog_post:
-        raise HTTPException(status_code=404, detail=f"Blog Post {id} not found")
-    
-    if blog_post.author_id != current_user.id:
-        raise HTTPException(status_code=403, detail="You are not the owner of this blog post")
-    
     try:
-        blog_post.title = blog_content.title
-        blog_post.body = blog_content.body
-        
+        # Ownership check, update and reload in a single statement
+        result = await db.execute(
+            update(BlogPost)
+            .where(BlogPost.id == id, BlogPost.author_id == current_user.id)
+            .values(
+                title=blog_content.title,
+                body=blog_content.body,
+                **summary_fields(blog_content.body),
+                updated_at=datetime.utcnow()
+            )
+            .returning(BlogPost)
+            .options(undefer(BlogPost.body))
+            .execution_options(synchronize_session=False)
+        )
+        blog_post = result.scalar_one_or_none()
+    except Exception:
+        logger.exception("update_blog_post failed")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    if blog_post is None:
+        raise await _missing_or_forbidden(db, id)
+
+    try:
+        # Writes that leave out "tags" keep the post's tags
+        if "tags" in blog_content.model_fields_set:
+            tags_changed = await set_post_tags(db, id, blog_post.created_at, blog_content.tags)
+            tags = blog_content.tags
+        else:
+            tags_changed = False
+            tags = await post_tag_names(db, id)
         await db.commit()
-        await db.refresh(blog_post)
+        await _post_changed(id, blog_post, tags_changed=tags_changed)
         
-        return blog_post
-    except Exception as e:
-        print(e)
+        return post_response(blog_post, tags)
+    except Exception:
+        logger.exception("update_blog_post failed")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_blog_post(
     id: int,
-    current_user: User = Depends(oauth2.get_current_user),
+    current_user: CurrentUser = Depends(oauth2.get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(select(BlogPost).where(BlogPost.id == id))
-    blog_post = result.scalar_one_or_none()
-    
-    if not blog_post:
-        raise HTTPException(status_code=404, detail=f"Blog Post {id} not found")
-    
-    if blog_post.author_id != current_user.id:
-        raise HTTPException(status_code=403, detail="You are not the owner of this blog post")
+    try:
+        result = await db.execute(
+            delete(BlogPost)
+            .where(BlogPost.id == id, BlogPost.author_id == current_user.id)
+            .returning(BlogPost.id)
+            .execution_options(synchronize_session=False)
+        )
+        deleted = result.first()
+    except Exception:
+        logger.exception("delete_blog_post failed")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    if deleted is None:
+        raise await _missing_or_forbidden(db, id)
     
     try:
-        await db.delete(blog_post)
+        # Only once the owner's DELETE matched: post_tags' deferred foreign
+        # key lets its rows (and the tag counts) go after the post
+        untagged = await remove_post_tags(db, id)
         await db.commit()
+        await _post_changed(id, tags_changed=untagged)
         return None
-    except Exception as e:
-        print(e)
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+    except Exception:
+        logger.exception("delete_blog_post failed")
+        raise HTTPException(status_code=500, detail="Internal server error")
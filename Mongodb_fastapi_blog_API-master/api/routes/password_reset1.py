@@ -1,20 +1,31 @@
+import logging
 from fastapi import APIRouter, HTTPException, status, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 
 from ..schemas import PasswordReset, PasswordResetRequest
 from ..database import get_db
 from ..models import User
 from ..send_email import password_reset
-from ..oauth2 import create_access_token, get_current_user
-from ..utils import get_password_hash
+from ..oauth2 import create_access_token, get_current_user, invalidate_user
+from ..utils import hasher
+from ..config import get_settings
+from ..rate_limit import RateLimit, client_ip, json_field
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/password",
     tags=["Password Reset"]
 )
 
-@router.post("/request/")
+# Every accepted request may send an email
+reset_request_limit = RateLimit("reset_request", [
+    (client_ip, get_settings().rate_limit_reset_ip),
+    (json_field("email"), get_settings().rate_limit_reset_email),
+])
+
+@router.post("/request/", dependencies=[Depends(reset_request_limit)])
 async def reset_request(
     user_email: PasswordResetRequest,
     db: AsyncSession = Depends(get_db)
@@ -36,8 +47,8 @@ async def reset_request(
                     "reset_link": reset_link
                 }
             )
-        except Exception as e:
-            print(f"Email error: {e}")
+        except Exception:
+            logger.warning("Password reset email not queued", exc_info=True, extra={"user_id": user.id})
         
         return {"msg": "Email has been sent with instructions to reset your password."}
     else:
@@ -56,9 +67,13 @@ async def reset(
     current_user = await get_current_user(token, db)
     
     # Update password
-    current_user.password = get_password_hash(new_password.password)
-    
+    hashed_password = await hasher.hash_async(new_password.password)
+    await db.execute(
+        update(User)
+        .where(User.id == current_user.id)
+        .values(password=hashed_password)
+    )
     await db.commit()
-    await db.refresh(current_user)
+    invalidate_user(current_user.id)
     
     return {"msg": "Password updated successfully"}
\ No newline at end of file
@@ -1,124 +1,148 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import insert, select, desc, tuple_
+from sqlalchemy.exc import IntegrityError
+import logging
 import secrets
-import traceback
-import sys
+from typing import List, Optional
 
-from ..schemas import User, UserResponse
-from ..database import get_db
-from ..models import User as UserModel
-from ..utils import get_password_hash
+from ..schemas import User, UserResponse, UserDetailsResponse, CurrentUser, BlogPostSummary
+from ..database import get_db, get_read_db
+from ..models import User as UserModel, BlogPost
+from ..serializers import summary_select
+from ..pagination import MAX_PAGE_SIZE, encode_cursor, decode_cursor
+from ..utils import hasher
 from ..send_email import send_registration_mail
 from .. import oauth2
+from ..config import get_settings
+from ..rate_limit import RateLimit, client_ip
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/users",
     tags=["Users"]
 )
 
-@router.post("/registration", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def registration(user_info: User, db: AsyncSession = Depends(get_db)):
-    print("\n" + "="*60, file=sys.stderr)
-    print("🔵 REGISTRATION REQUEST RECEIVED", file=sys.stderr)
-    print(f"Name: {user_info.name}", file=sys.stderr)
-    print(f"Email: {user_info.email}", file=sys.stderr)
-    print(f"Password length: {len(user_info.password)}", file=sys.stderr)
-    print("="*60, file=sys.stderr)
-    
-    try:
-        # Check username
-        print("📝 Step 1: Checking username...", file=sys.stderr)
-        result = await db.execute(select(UserModel).where(UserModel.name == user_info.name))
-        username_found = result.scalar_one_or_none()
-        
-        if username_found:
-            print(f"❌ Username '{user_info.name}' already exists!", file=sys.stderr)
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="There already is a user by that name"
-            )
-        print("✅ Username available", file=sys.stderr)
+def _violated_constraint(error: IntegrityError) -> str:
+    # asyncpg's exception (under SQLAlchemy's adapter) names the unique index;
+    # SQLite only has the message, "UNIQUE constraint failed: users.email".
+    # Never the whole message: Postgres' DETAIL line echoes the duplicate value
+    name = getattr(error.orig.__cause__, "constraint_name", None)
+    return name or str(error.orig).split("\n", 1)[0]
 
-        # Check email
-        print("📝 Step 2: Checking email...", file=sys.stderr)
-        result = await db.execute(select(UserModel).where(UserModel.email == user_info.email))
-        email_found = result.scalar_one_or_none()
-        
-        if email_found:
-            print(f"❌ Email '{user_info.email}' already exists!", file=sys.stderr)
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="There already is a user by that email"
-            )
-        print("✅ Email available", file=sys.stderr)
+def _conflict_detail(error: IntegrityError) -> str:
+    constraint = _violated_constraint(error)
+    if constraint == "ix_users_email" or constraint.endswith("users.email"):
+        return "There already is a user by that email"
+    return "There already is a user by that name"
 
-        # Hash password
-        print("📝 Step 3: Hashing password...", file=sys.stderr)
-        try:
-            hashed_password = get_password_hash(user_info.password)
-            print(f"✅ Password hashed (length: {len(hashed_password)})", file=sys.stderr)
-        except Exception as e:
-            print(f"❌ PASSWORD HASH FAILED: {e}", file=sys.stderr)
-            traceback.print_exc()
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Password hashing failed: {str(e)}"
-            )
+registration_limit = RateLimit("registration", [(client_ip, get_settings().rate_limit_registration_ip)])
 
-        # Create user
-        print("📝 Step 4: Creating user object...", file=sys.stderr)
-        new_user = UserModel(
-            name=user_info.name,
-            email=user_info.email,
-            password=hashed_password,
-            api_key=secrets.token_hex(20)
+@router.post(
+    "/registration",
+    response_model=UserResponse,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(registration_limit)]
+)
+async def registration(user_info: User, db: AsyncSession = Depends(get_db)):
+    # Hash password
+    try:
+        hashed_password = await hasher.hash_async(user_info.password)
+    except Exception as e:
+        logger.exception("Password hashing failed")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Password hashing failed: {str(e)}"
         )
-        print("✅ User object created", file=sys.stderr)
-        
-        # Save to DB
-        print("📝 Step 5: Saving to database...", file=sys.stderr)
-        db.add(new_user)
-        await db.commit()
-        await db.refresh(new_user)
-        print(f"✅ User saved with ID: {new_user.id}", file=sys.stderr)
 
-        # Send email
-        print("📝 Step 6: Sending email...", file=sys.stderr)
-        try:
-            await send_registration_mail(
-                "Registration successful",
-                new_user.email,
-                {
-                    "title": "Registration successful",
-                    "name": new_user.name
-                }
+    # One round trip: the unique indexes on name and email reject duplicates,
+    # which also closes the race two concurrent signups had with pre-check SELECTs
+    try:
+        result = await db.execute(
+            insert(UserModel)
+            .values(
+                name=user_info.name,
+                email=user_info.email,
+                password=hashed_password,
+                api_key=secrets.token_hex(20)
             )
-            print("✅ Email sent successfully", file=sys.stderr)
-        except Exception as email_error:
-            print(f"⚠️ Email failed (ignored): {email_error}", file=sys.stderr)
-
-        print("="*60, file=sys.stderr)
-        print("🎉 REGISTRATION COMPLETED SUCCESSFULLY", file=sys.stderr)
-        print("="*60 + "\n", file=sys.stderr)
-        
-        return new_user
-        
-    except HTTPException as he:
-        print(f"⚠️ HTTP Exception: {he.detail}", file=sys.stderr)
-        raise
+            .returning(UserModel.id, UserModel.name, UserModel.email)
+        )
+        new_user = result.one()
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        detail = _conflict_detail(e)
+        logger.info("Registration rejected", extra={"username": user_info.name, "reason": detail})
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
     except Exception as e:
-        print("="*60, file=sys.stderr)
-        print(f"💥 UNEXPECTED ERROR: {type(e).__name__}", file=sys.stderr)
-        print(f"Message: {str(e)}", file=sys.stderr)
-        print("="*60, file=sys.stderr)
-        traceback.print_exc()
+        logger.exception("Registration failed")
         await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Registration failed: {str(e)}"
         )
+    logger.info("User registered", extra={"user_id": new_user.id})
+
+    # Send email
+    try:
+        await send_registration_mail(
+            "Registration successful",
+            new_user.email,
+            {
+                "title": "Registration successful",
+                "name": new_user.name
+            }
+        )
+    except Exception:
+        logger.warning("Registration email not queued", exc_info=True, extra={"user_id": new_user.id})
+    
+    return new_user
+
+async def _author_posts(db: AsyncSession, author_id: int, limit: int, after: Optional[str] = None) -> list:
+    # Range scan over ix_blog_posts_author_created_at_id
+    query = (
+        summary_select()
+        .where(BlogPost.author_id == author_id)
+        .order_by(desc(BlogPost.created_at), desc(BlogPost.id))
+        .limit(limit)
+    )
+    if after:
+        created_at, last_id = decode_cursor(after)
+        query = query.where(tuple_(BlogPost.created_at, BlogPost.id) < (created_at, last_id))
+    result = await db.execute(query)
+    return result.all()
+
+@router.get("/{id}/posts", response_model=List[BlogPostSummary])
+async def user_posts(
+    id: int,
+    response: Response,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    posts = await _author_posts(db, id, limit, after)
+
+    if not posts and not after:
+        result = await db.execute(select(UserModel.id).where(UserModel.id == id))
+        if result.first() is None:
+            raise HTTPException(status_code=404, detail=f"User {id} not found")
+
+    if len(posts) == limit:
+        last = posts[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.id)
+    return posts
 
-@router.post("/details", response_model=UserResponse)
-async def details(current_user: UserModel = Depends(oauth2.get_current_user)):
-    return current_user
\ No newline at end of file
+@router.post("/details", response_model=UserDetailsResponse, response_model_exclude_none=True)
+async def details(
+    include: Optional[str] = Query(None, pattern="^posts$"),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    current_user: CurrentUser = Depends(oauth2.get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    user = UserDetailsResponse(**current_user.model_dump())
+    if include == "posts":
+        rows = await _author_posts(db, current_user.id, limit)
+        user.posts = [BlogPostSummary.model_validate(row) for row in rows]
+    return user
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, field_validator
+from typing import List, Optional
 from datetime import datetime
 
 class User(BaseModel):
@@ -15,9 +15,33 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class CurrentUser(BaseModel):
+    """Authenticated principal, detached from any DB session"""
+    id: int
+    name: str
+    email: EmailStr
+    
+    class Config:
+        from_attributes = True
+
+MAX_TAGS = 10
+MAX_TAG_LENGTH = 50
+
 class BlogContent(BaseModel):
     title: str
     body: str
+    tags: List[str] = []
+
+    @field_validator("tags")
+    @classmethod
+    def normalize_tags(cls, tags: List[str]) -> List[str]:
+        # Lowercased and trimmed, blanks and duplicates dropped
+        tags = list(dict.fromkeys(tag.strip().lower() for tag in tags if tag.strip()))
+        if len(tags) > MAX_TAGS:
+            raise ValueError(f"at most {MAX_TAGS} tags")
+        if any(len(tag) > MAX_TAG_LENGTH for tag in tags):
+            raise ValueError(f"tags are at most {MAX_TAG_LENGTH} characters")
+        return tags
 
 class BlogContentResponse(BaseModel):
     id: int
@@ -26,16 +50,62 @@ class BlogContentResponse(BaseModel):
     author_name: str
     author_id: int
     created_at: datetime
+    tags: List[str] = []
     
     class Config:
         from_attributes = True
 
+class BlogPostSummary(BaseModel):
+    """A post in a list: the excerpt instead of the body"""
+    id: int
+    title: str
+    excerpt: Optional[str] = None
+    body_length: Optional[int] = None
+    reading_minutes: Optional[int] = None
+    author_name: str
+    author_id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class PopularPost(BlogPostSummary):
+    views: int
+
+class TagCount(BaseModel):
+    name: str
+    post_count: int
+
+class SearchResult(BaseModel):
+    id: int
+    title: str
+    author_name: str
+    author_id: int
+    created_at: datetime
+    rank: float
+    snippet: str
+
+class BulkImportError(BaseModel):
+    line: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkImportError]
+    errors_truncated: bool = False
+
+class UserDetailsResponse(UserResponse):
+    posts: Optional[List[BlogPostSummary]] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
 
 class TokenData(BaseModel):
     id: Optional[int] = None
+    name: Optional[str] = None
+    email: Optional[str] = None
 
 class PasswordResetRequest(BaseModel):
     email: EmailStr
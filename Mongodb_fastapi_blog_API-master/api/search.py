@@ -0,0 +1,201 @@
+"""Full-text search over blog posts.
+
+On Postgres, posts carry a generated, weighted tsvector column (title
+ranks above body) with a GIN index, both added by a migration; queries use websearch_to_tsquery,
+ts_rank and ts_headline. Other databases (SQLite in development) fall
+back to an inverted index kept in this process: built from the table on
+first search and updated by the blog write endpoints of this worker.
+
+Results are ordered by (rank DESC, id DESC) and paged with a keyset
+cursor over that pair.
+"""
+import asyncio
+import html
+import math
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, literal_column, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import BlogPost
+
+SEARCH_CONFIG = "english"
+HIGHLIGHT_START, HIGHLIGHT_STOP = "<mark>", "</mark>"
+# ts_headline returns the body as is, markup included, so it marks matches
+# with control characters that survive html.escape and become <mark> after
+_HEADLINE_START, _HEADLINE_STOP = "\x02", "\x03"
+# Inlined with an explicit type: a bound parameter would be sent as varchar,
+# which does not resolve to the regconfig overloads
+_REGCONFIG = literal_column(f"'{SEARCH_CONFIG}'::regconfig")
+
+_RESULT_COLUMNS = (
+    BlogPost.id,
+    BlogPost.title,
+    BlogPost.author_id,
+    BlogPost.author_name,
+    BlogPost.created_at,
+)
+
+
+async def _search_postgres(db: AsyncSession, q: str, limit: int, after: Optional[Tuple[float, int]]) -> List[dict]:
+    search_vector = literal_column("blog_posts.search_vector")
+    query = func.websearch_to_tsquery(_REGCONFIG, q)
+    rank = func.ts_rank(search_vector, query)
+
+    page = (
+        select(BlogPost.id.label("id"), rank.label("rank"))
+        .where(search_vector.op("@@")(query))
+        .order_by(rank.desc(), BlogPost.id.desc())
+        .limit(limit)
+    )
+    if after:
+        page = page.where(tuple_(rank, BlogPost.id) < after)
+    page = page.subquery()
+
+    # ts_headline is expensive: only run it for the rows of this page
+    snippet = func.ts_headline(
+        _REGCONFIG, BlogPost.body, query,
+        f"StartSel={_HEADLINE_START}, StopSel={_HEADLINE_STOP}, MaxWords=35, MinWords=15, MaxFragments=2"
+    )
+    result = await db.execute(
+        select(*_RESULT_COLUMNS, page.c.rank, snippet.label("snippet"))
+        .join(page, page.c.id == BlogPost.id)
+        .order_by(page.c.rank.desc(), BlogPost.id.desc())
+    )
+    return [{**row._mapping, "snippet": _escape_headline(row.snippet)} for row in result]
+
+
+def _escape_headline(headline: str) -> str:
+    return (
+        html.escape(headline)
+        .replace(_HEADLINE_START, HIGHLIGHT_START)
+        .replace(_HEADLINE_STOP, HIGHLIGHT_STOP)
+    )
+
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_TITLE_WEIGHT = 2.0
+
+
+def _tokens(text: str) -> List[str]:
+    return [t.lower() for t in _TOKEN.findall(text)]
+
+
+class InvertedIndex:
+    """In-memory term -> {post id: weighted term frequency} index"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self.docs: Dict[int, dict] = {}
+        self.ready = False
+        self._lock = asyncio.Lock()
+
+    async def ensure_built(self, db: AsyncSession):
+        if self.ready:
+            return
+        async with self._lock:
+            if self.ready:
+                return
+            result = await db.stream(select(*_RESULT_COLUMNS, BlogPost.body).execution_options(yield_per=1000))
+            async for row in result:
+                self.add(dict(row._mapping))
+            self.ready = True
+
+    def add(self, post: dict):
+        self.remove(post["id"])
+        weights: Dict[str, float] = defaultdict(float)
+        for term in _tokens(post["title"]):
+            weights[term] += _TITLE_WEIGHT
+        for term in _tokens(post["body"]):
+            weights[term] += 1.0
+        for term, weight in weights.items():
+            self.postings[term][post["id"]] = weight
+        self.docs[post["id"]] = {**post, "terms": list(weights)}
+
+    def remove(self, id: int):
+        doc = self.docs.pop(id, None)
+        if doc is None:
+            return
+        for term in doc["terms"]:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def search(self, q: str, limit: int, after: Optional[Tuple[float, int]]) -> List[dict]:
+        terms = list(dict.fromkeys(_tokens(q)))
+        if not terms:
+            return []
+        postings = [self.postings.get(term, {}) for term in terms]
+        if any(not p for p in postings):
+            return []
+
+        # Every term must match; score with tf-idf, rarest term first
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        total = len(self.docs)
+        scored = []
+        for id in candidates:
+            rank = sum(
+                (1 + math.log(p[id])) * math.log(1 + total / len(p)) for p in postings
+            )
+            rank = round(rank, 6)
+            if after is None or (rank, id) < after:
+                scored.append((rank, id))
+        scored.sort(reverse=True)
+
+        results = []
+        for rank, id in scored[:limit]:
+            doc = self.docs[id]
+            results.append({
+                **{k: doc[k] for k in ("id", "title", "author_id", "author_name", "created_at")},
+                "rank": rank,
+                "snippet": _snippet(doc["body"], set(terms)),
+            })
+        return results
+
+
+def _snippet(body: str, terms: set, words: int = 30) -> str:
+    parts = body.split()
+    first = next((i for i, w in enumerate(parts) if set(_tokens(w)) & terms), 0)
+    start = max(0, first - words // 3)
+    window = []
+    for word in parts[start:start + words]:
+        escaped = html.escape(word)
+        if set(_tokens(word)) & terms:
+            escaped = f"{HIGHLIGHT_START}{escaped}{HIGHLIGHT_STOP}"
+        window.append(escaped)
+    prefix = "... " if start > 0 else ""
+    suffix = " ..." if start + words < len(parts) else ""
+    return prefix + " ".join(window) + suffix
+
+
+local_index = InvertedIndex()
+
+
+async def search_posts(db: AsyncSession, q: str, limit: int, after: Optional[Tuple[float, int]] = None) -> List[dict]:
+    if db.bind.dialect.name == "postgresql":
+        return await _search_postgres(db, q, limit, after)
+    await local_index.ensure_built(db)
+    return local_index.search(q, limit, after)
+
+
+def index_post(post: BlogPost):
+    """Keep the local fallback index in step with a created/updated post"""
+    if local_index.ready:
+        local_index.add({
+            "id": post.id,
+            "title": post.title,
+            "body": post.body,
+            "author_id": post.author_id,
+            "author_name": post.author_name,
+            "created_at": post.created_at,
+        })
+
+
+def unindex_post(id: int):
+    if local_index.ready:
+        local_index.remove(id)
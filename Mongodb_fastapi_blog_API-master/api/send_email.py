@@ -1,49 +1,97 @@
-import os
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from dotenv import load_dotenv
+from email.message import EmailMessage
+from email.utils import formataddr
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Dict, Optional, Tuple
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
-load_dotenv()
+from .config import get_settings
+from .mail_queue import mail_queue
+from .models import User
 
 class Envs:
-    MAIL_USERNAME = os.getenv('MAIL_USERNAME')
-    MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
-    MAIL_FROM = os.getenv('MAIL_FROM')
-    MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
-    MAIL_SERVER = os.getenv('MAIL_SERVER')
-    MAIL_FROM_NAME = os.getenv('MAIL_FROM_NAME', 'FastAPI Blog')
-
-conf = ConnectionConfig(
-    MAIL_USERNAME=Envs.MAIL_USERNAME,
-    MAIL_PASSWORD=Envs.MAIL_PASSWORD,
-    MAIL_FROM=Envs.MAIL_FROM,
-    MAIL_PORT=Envs.MAIL_PORT,
-    MAIL_SERVER=Envs.MAIL_SERVER,
-    MAIL_FROM_NAME=Envs.MAIL_FROM_NAME,
-    MAIL_STARTTLS=True,      # ← Đổi từ MAIL_TLS
-    MAIL_SSL_TLS=False,      # ← Đổi từ MAIL_SSL
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER="api/templates"
+    MAIL_FROM = get_settings().mail_from
+    MAIL_FROM_NAME = get_settings().mail_from_name
+
+# Templates never change at runtime: no mtime checks, keep every compiled one
+templates = Environment(
+    loader=FileSystemLoader(Path(__file__).parent / "templates"),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False,
+    cache_size=-1
 )
+_compiled: Dict[str, Template] = {}
+
+def load_templates():
+    """Compile every mail template once; called at startup"""
+    for name in templates.list_templates(extensions=["html"]):
+        _compiled[name] = templates.get_template(name)
+
+def get_template(name: str) -> Template:
+    template = _compiled.get(name)
+    if template is None:
+        template = _compiled[name] = templates.get_template(name)
+    return template
+
+def _message(subject: str, email_to: str, html: str) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = formataddr((Envs.MAIL_FROM_NAME, Envs.MAIL_FROM))
+    message["To"] = email_to
+    message.set_content(html, subtype="html")
+    return message
+
+def build_message(subject: str, email_to: str, template_name: str, body: dict) -> EmailMessage:
+    return _message(subject, email_to, get_template(template_name).render(**body))
+
+async def render_batch(
+    subject: str,
+    template_name: str,
+    recipients: AsyncIterable[Tuple[str, dict]],
+    shared: Optional[dict] = None
+) -> AsyncIterator[EmailMessage]:
+    """Render one message per (email, context) pair with a single compiled template"""
+    template = get_template(template_name)
+    shared = shared or {}
+    async for email_to, context in recipients:
+        yield _message(subject, email_to, template.render({**shared, **context}))
+
+async def send_batch(messages: AsyncIterable[EmailMessage]) -> int:
+    """Stream messages into the mail queue, waiting whenever it is full"""
+    count = 0
+    async for message in messages:
+        await mail_queue.put(message)
+        count += 1
+    return count
+
+async def _newsletter_recipients(sessions: async_sessionmaker, batch_size: int):
+    """Users in id order, one short read per batch: no transaction stays open
+    while the batch waits for room in the mail queue"""
+    last_id = 0
+    while True:
+        async with sessions() as db:
+            rows = (await db.execute(
+                select(User.id, User.email, User.name)
+                .where(User.id > last_id)
+                .order_by(User.id)
+                .limit(batch_size)
+            )).all()
+        if not rows:
+            return
+        for _, email, name in rows:
+            yield email, {"name": name}
+        last_id = rows[-1].id
+
+async def send_newsletter(sessions: async_sessionmaker, subject: str, content: str, batch_size: int = 500) -> int:
+    """Queue the newsletter for every user; the mail queue must be running"""
+    return await send_batch(render_batch(
+        subject, "newsletter.html", _newsletter_recipients(sessions, batch_size),
+        {"title": subject, "content": content}
+    ))
 
 async def send_registration_mail(subject: str, email_to: str, body: dict):
-    message = MessageSchema(
-        subject=subject,
-        recipients=[email_to],
-        template_body=body,
-        subtype=MessageType.html,
-    )
-    
-    fm = FastMail(conf)
-    await fm.send_message(message, template_name='email.html')
+    mail_queue.enqueue(build_message(subject, email_to, 'email.html', body))
 
 async def password_reset(subject: str, email_to: str, body: dict):
-    message = MessageSchema(
-        subject=subject,
-        recipients=[email_to],
-        template_body=body,
-        subtype=MessageType.html,
-    )
-    
-    fm = FastMail(conf)
-    await fm.send_message(message, template_name='password_reset.html')
\ No newline at end of file
+    mail_queue.enqueue(build_message(subject, email_to, 'password_reset.html', body))
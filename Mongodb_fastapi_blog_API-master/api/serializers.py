@@ -0,0 +1,149 @@
+"""Response serialization for the /blog routes.
+
+The default path loads ORM objects and runs every row through the
+BlogContentResponse model. With FAST_JSON=1 the routes select only the
+response columns and turn the rows straight into JSON bytes: with orjson
+when it is installed, otherwise with a TypeAdapter over a TypedDict,
+which serializes without building a model per row. Both produce the same
+JSON as the default path.
+
+Lists of posts always select just the BlogPostSummary columns; only the
+model-vs-fast choice of serializer applies to them.
+"""
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+from pydantic import TypeAdapter
+from sqlalchemy import Select, select
+from sqlalchemy.orm import undefer
+from typing_extensions import TypedDict
+
+from .config import get_settings
+from .models import BlogPost
+from .schemas import BlogContentResponse, BlogPostSummary, PopularPost, TagCount
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_JSON = get_settings().fast_json
+
+POST_COLUMNS = (
+    BlogPost.id,
+    BlogPost.title,
+    BlogPost.body,
+    BlogPost.author_name,
+    BlogPost.author_id,
+    BlogPost.created_at,
+)
+
+
+class PostRow(TypedDict):
+    id: int
+    title: str
+    body: str
+    author_name: str
+    author_id: int
+    created_at: datetime
+
+
+class TaggedPostRow(PostRow):
+    tags: List[str]
+
+
+SUMMARY_COLUMNS = (
+    BlogPost.id,
+    BlogPost.title,
+    BlogPost.excerpt,
+    BlogPost.body_length,
+    BlogPost.reading_minutes,
+    BlogPost.author_name,
+    BlogPost.author_id,
+    BlogPost.created_at,
+)
+
+
+class SummaryRow(TypedDict):
+    id: int
+    title: str
+    excerpt: Optional[str]
+    body_length: Optional[int]
+    reading_minutes: Optional[int]
+    author_name: str
+    author_id: int
+    created_at: datetime
+
+
+_tagged_row = TypeAdapter(TaggedPostRow)
+_summary = TypeAdapter(BlogPostSummary)
+_summary_list = TypeAdapter(List[BlogPostSummary])
+_summary_row_list = TypeAdapter(List[SummaryRow])
+_popular_list = TypeAdapter(List[PopularPost])
+_tag_count_list = TypeAdapter(List[TagCount])
+
+
+def post_select() -> Select:
+    if FAST_JSON:
+        return select(*POST_COLUMNS, BlogPost.updated_at)
+    return select(BlogPost).options(undefer(BlogPost.body))
+
+
+def summary_select() -> Select:
+    return select(*SUMMARY_COLUMNS)
+
+
+def fetch_post(result):
+    return result.one_or_none() if FAST_JSON else result.scalar_one_or_none()
+
+
+def dump_post_row(row, tags: List[str]) -> bytes:
+    """Serialize one row of POST_COLUMNS with the post's tags"""
+    entry = {**row._asdict(), "tags": tags}
+    if orjson is not None:
+        return orjson.dumps(entry)
+    return _tagged_row.dump_json(entry)
+
+
+def post_response(post, tags: List[str]) -> BlogContentResponse:
+    return BlogContentResponse.model_validate(post).model_copy(update={"tags": sorted(tags)})
+
+
+def dump_post(post, tags: List[str]) -> bytes:
+    """Serialize the result of post_select() with the post's tags"""
+    if not FAST_JSON:
+        return post_response(post, tags).model_dump_json().encode()
+    row = post._asdict()
+    del row["updated_at"]
+    row["tags"] = sorted(tags)
+    return orjson.dumps(row) if orjson is not None else _tagged_row.dump_json(row)
+
+
+def last_modified(post) -> datetime:
+    return post.updated_at or post.created_at
+
+
+def dump_summaries(rows: Sequence) -> bytes:
+    """Serialize rows of SUMMARY_COLUMNS"""
+    if not FAST_JSON:
+        return _summary_list.dump_json(_summary_list.validate_python(rows, from_attributes=True))
+    if orjson is not None:
+        return orjson.dumps([row._asdict() for row in rows])
+    return _summary_row_list.dump_json([row._asdict() for row in rows])
+
+
+def dump_summary(post) -> bytes:
+    """Serialize one post, ORM object or row, as a BlogPostSummary"""
+    return _summary.dump_json(_summary.validate_python(post, from_attributes=True))
+
+
+def dump_popular(posts: List[dict]) -> bytes:
+    """Serialize summary dicts carrying a `views` count"""
+    if FAST_JSON and orjson is not None:
+        return orjson.dumps(posts)
+    return _popular_list.dump_json(_popular_list.validate_python(posts))
+
+
+def dump_tag_counts(rows: Sequence) -> bytes:
+    """Serialize (name, post_count) rows"""
+    return _tag_count_list.dump_json(_tag_count_list.validate_python(rows, from_attributes=True))
@@ -0,0 +1,131 @@
+"""Post tags.
+
+post_tags copies each post's created_at, so a tag's feed (newest first,
+keyset-paged like the main feed) is one range scan of
+ix_post_tags_tag_created_at_post that never reads untagged posts.
+tags.post_count is adjusted in the same transaction as every change to
+post_tags instead of being counted, which keeps the tag cloud a short
+index scan however many posts there are.
+
+Callers commit; every function here only adds statements to the session's
+transaction.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import PostTag, Tag
+
+
+async def _tag_ids(db: AsyncSession, names: Iterable[str]) -> Dict[str, int]:
+    """Ids by name, creating the tags that do not exist yet"""
+    # In a fixed order, so that concurrent inserts of overlapping new tags
+    # take their row locks in the same order instead of deadlocking
+    names = sorted(set(names))
+    dialect_insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    await db.execute(
+        dialect_insert(Tag).values([{"name": name} for name in names]).on_conflict_do_nothing(index_elements=["name"])
+    )
+    result = await db.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names)))
+    return dict(result.all())
+
+
+async def _adjust_counts(db: AsyncSession, deltas: Dict[int, int]):
+    deltas = {tag_id: delta for tag_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    await db.execute(
+        update(Tag)
+        .where(Tag.id.in_(deltas))
+        .values(post_count=Tag.post_count + case(deltas, value=Tag.id, else_=0))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def add_post_tags(db: AsyncSession, posts: Sequence[Tuple[int, datetime, List[str]]]) -> bool:
+    """Tag new posts, given as (id, created_at, tag names); True if any tag was added"""
+    names = {name for _, _, tags in posts for name in tags}
+    if not names:
+        return False
+    ids = await _tag_ids(db, names)
+    rows = [
+        {"post_id": post_id, "tag_id": ids[name], "created_at": created_at}
+        for post_id, created_at, tags in posts
+        for name in tags
+    ]
+    await db.execute(insert(PostTag), rows)
+    await _adjust_counts(db, Counter(row["tag_id"] for row in rows))
+    return True
+
+
+async def set_post_tags(db: AsyncSession, post_id: int, created_at: datetime, names: List[str]) -> bool:
+    """Replace a post's tags with `names`; True if they changed"""
+    result = await db.execute(
+        select(Tag.name, PostTag.tag_id).join(Tag, Tag.id == PostTag.tag_id).where(PostTag.post_id == post_id)
+    )
+    current = dict(result.all())
+    removed = [tag_id for name, tag_id in current.items() if name not in names]
+    added = [name for name in names if name not in current]
+    if not removed and not added:
+        return False
+
+    deltas = dict.fromkeys(removed, -1)
+    if removed:
+        await db.execute(delete(PostTag).where(PostTag.post_id == post_id, PostTag.tag_id.in_(removed)))
+    if added:
+        ids = await _tag_ids(db, added)
+        await db.execute(
+            insert(PostTag),
+            [{"post_id": post_id, "tag_id": tag_id, "created_at": created_at} for tag_id in ids.values()],
+        )
+        deltas.update(dict.fromkeys(ids.values(), 1))
+    await _adjust_counts(db, deltas)
+    return True
+
+
+async def remove_post_tags(db: AsyncSession, post_id: int) -> bool:
+    """Untag a post deleted in this transaction; True if it had tags.
+
+    post_tags.post_id has no ON DELETE CASCADE, which would drop the rows
+    without adjusting the counts; the constraint is deferred, so this can
+    run after the post's DELETE and before the commit.
+    """
+    result = await db.execute(delete(PostTag).where(PostTag.post_id == post_id).returning(PostTag.tag_id))
+    tag_ids = result.scalars().all()
+    await _adjust_counts(db, dict.fromkeys(tag_ids, -1))
+    return bool(tag_ids)
+
+
+async def posts_tag_names(db: AsyncSession, post_ids: List[int]) -> Dict[int, List[str]]:
+    """Tag names by post id, sorted, for a batch of posts (those without tags are left out)"""
+    result = await db.execute(
+        select(PostTag.post_id, Tag.name)
+        .join(Tag, Tag.id == PostTag.tag_id)
+        .where(PostTag.post_id.in_(post_ids))
+        .order_by(PostTag.post_id, Tag.name)
+    )
+    names: Dict[int, List[str]] = {}
+    for post_id, name in result:
+        names.setdefault(post_id, []).append(name)
+    return names
+
+
+async def post_tag_names(db: AsyncSession, post_id: int) -> List[str]:
+    result = await db.execute(
+        select(Tag.name).join(PostTag, PostTag.tag_id == Tag.id).where(PostTag.post_id == post_id).order_by(Tag.name)
+    )
+    return list(result.scalars().all())
+
+
+def tag_cloud_select(limit: int):
+    """Most used tags, served from ix_tags_post_count_name"""
+    return (
+        select(Tag.name, Tag.post_count)
+        .where(Tag.post_count > 0)
+        .order_by(Tag.post_count.desc(), Tag.name)
+        .limit(limit)
+    )
@@ -1,10 +1,97 @@
+import asyncio
 import hashlib
+import hmac
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from .config import get_settings
+
+_LEGACY_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+class PasswordHasher:
+    """Salted bcrypt hashing run on a bounded thread pool.
+
+    bcrypt releases the GIL, so a small pool keeps logins and signups from
+    blocking the event loop while capping how many CPUs hashing can take.
+    """
+
+    def __init__(self, rounds: int = 12, workers: Optional[int] = None):
+        self.context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+        self._workers = workers or os.cpu_count() or 1
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._dummy_hash: Optional[str] = None
+
+    @property
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="password-hash")
+        return self._pool
+
+    def hash(self, password: str) -> str:
+        return self.context.hash(password)
+
+    def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; also return a new hash if the stored one is outdated.
+
+        Hashes from before bcrypt (unsalted SHA-256 hex digests) and bcrypt
+        hashes with a different cost than configured both get a replacement.
+        """
+        if _LEGACY_SHA256.match(hashed):
+            digest = hashlib.sha256(password.encode()).hexdigest()
+            if not hmac.compare_digest(digest, hashed):
+                return False, None
+            return True, self.hash(password)
+        return self.context.verify_and_update(password, hashed)
+
+    def verify_unknown(self, password: str) -> Tuple[bool, Optional[str]]:
+        """Fail a login for an unknown user as slowly as a wrong password.
+
+        Checks the password against a hash of a random secret at the
+        configured cost, so response times do not tell which usernames exist.
+        """
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash(os.urandom(16).hex())
+        self.context.verify(password, self._dummy_hash)
+        return False, None
+
+    async def hash_async(self, password: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.hash, password)
+
+    async def verify_and_update_async(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.verify_and_update, password, hashed)
+
+    async def start(self):
+        """Build verify_unknown's hash ahead of the first login, which would otherwise pay for it"""
+        if self._dummy_hash is None:
+            self._dummy_hash = await self.hash_async(os.urandom(16).hex())
+
+    async def verify_unknown_async(self, password: str) -> Tuple[bool, Optional[str]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.verify_unknown, password)
+
+    def shutdown(self):
+        """Wait for running hashes, then release the threads (recreated on next use)"""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+hasher = PasswordHasher(
+    rounds=get_settings().bcrypt_rounds,
+    workers=get_settings().password_hash_workers
+)
 
 def verify_password(plain_password, hashed_password):
-    """Verify password using SHA256"""
-    hashed = hashlib.sha256(plain_password.encode()).hexdigest()
-    return hashed == hashed_password
+    """Verify password against a bcrypt or legacy SHA256 hash"""
+    return hasher.verify_and_update(plain_password, hashed_password)[0]
 
 def get_password_hash(password):
-    """Hash password using SHA256"""
-    return hashlib.sha256(password.encode()).hexdigest()
\ No newline at end of file
+    """Hash password using bcrypt"""
+    return hasher.hash(password)
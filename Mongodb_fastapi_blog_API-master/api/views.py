@@ -0,0 +1,165 @@
+"""Write-behind view counts and the popular-posts ranking.
+
+Reading a post only bumps an in-process counter. A background task
+started from the app lifespan flushes the counters every
+VIEWS_FLUSH_INTERVAL seconds in one UPDATE per chunk of posts, and that
+UPDATE returns the new totals. The totals feed an in-memory top-K, which
+is what GET /blog/popular ranks by.
+
+Each worker counts and flushes its own views; the database totals are the
+sum of all of them. A worker's top-K only learns about posts that other
+workers flushed when it reloads from the views index, every
+VIEWS_RELOAD_INTERVAL seconds. Views counted since the last flush are
+lost if the process is killed without a clean shutdown.
+"""
+import asyncio
+import heapq
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from .config import get_settings
+from .models import BlogPost
+
+logger = logging.getLogger(__name__)
+
+FLUSH_CHUNK_SIZE = 1000
+
+
+class ViewCounter:
+    def __init__(self, flush_interval: float = 5.0, top_k: int = 100, reload_interval: float = 60.0):
+        self.flush_interval = flush_interval
+        self.top_k = top_k
+        self.reload_interval = reload_interval
+        self._pending: Dict[int, int] = {}
+        self._top: Dict[int, int] = {}
+        # bumped whenever the ranking changes, for cache keys
+        self.version = 0
+        self._sessions: Optional[async_sessionmaker] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_reload = 0.0
+        self.flushed = 0
+        self.flush_failures = 0
+
+    def record(self, post_id: int):
+        self._pending[post_id] = self._pending.get(post_id, 0) + 1
+
+    def forget(self, post_id: int):
+        """Drop a deleted post from the ranking"""
+        self._pending.pop(post_id, None)
+        if self._top.pop(post_id, None) is not None:
+            self.version += 1
+
+    def popular(self, limit: int) -> List[Tuple[int, int]]:
+        """[(post id, views)] by views descending, then newest id first"""
+        return heapq.nlargest(limit, self._top.items(), key=lambda item: (item[1], item[0]))
+
+    def _merge_top(self, totals: Dict[int, int]):
+        if not totals:
+            return
+        merged = {**self._top, **totals}
+        if len(merged) > self.top_k:
+            merged = dict(heapq.nlargest(self.top_k, merged.items(), key=lambda item: (item[1], item[0])))
+        if merged != self._top:
+            self._top = merged
+            self.version += 1
+
+    async def reload(self):
+        """Rebuild the ranking from ix_blog_posts_views (an index range scan of top_k rows)"""
+        async with self._sessions() as db:
+            result = await db.execute(
+                select(BlogPost.id, BlogPost.views)
+                .where(BlogPost.views > 0)
+                .order_by(BlogPost.views.desc(), BlogPost.id.desc())
+                .limit(self.top_k)
+            )
+            self._top = {}
+            self._merge_top(dict(result.all()))
+            self.version += 1
+        self._last_reload = time.monotonic()
+
+    async def flush(self):
+        """Write the buffered increments; on failure they go back into the buffer"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        items = list(pending.items())
+        totals: Dict[int, int] = {}
+        committed = False
+        try:
+            async with self._sessions() as db:
+                for start in range(0, len(items), FLUSH_CHUNK_SIZE):
+                    chunk = dict(items[start:start + FLUSH_CHUNK_SIZE])
+                    result = await db.execute(
+                        update(BlogPost)
+                        .where(BlogPost.id.in_(chunk))
+                        .values(views=BlogPost.views + case(chunk, value=BlogPost.id, else_=0))
+                        .returning(BlogPost.id, BlogPost.views)
+                        .execution_options(synchronize_session=False)
+                    )
+                    totals.update(result.all())
+                await db.commit()
+                committed = True
+        except Exception:
+            self.flush_failures += 1
+            logger.warning("View count flush failed, keeping counts for the next one",
+                           exc_info=True, extra={"posts": len(pending)})
+            self._restore(pending)
+            return
+        except BaseException:
+            # Cancelled by stop() mid-flush: its final flush writes them
+            if not committed:
+                self._restore(pending)
+            raise
+        self.flushed += sum(pending.values())
+        self._merge_top(totals)
+
+    def _restore(self, pending: Dict[int, int]):
+        for post_id, count in pending.items():
+            self._pending[post_id] = self._pending.get(post_id, 0) + count
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if time.monotonic() - self._last_reload >= self.reload_interval:
+                try:
+                    await self.reload()
+                except Exception:
+                    logger.warning("Popular posts reload failed", exc_info=True)
+
+    async def start(self, sessions: async_sessionmaker):
+        if self._task is not None:
+            return
+        self._sessions = sessions
+        await self.reload()
+        self._task = asyncio.create_task(self._run(), name="view-counter-flush")
+
+    async def stop(self):
+        """Stop the flush loop and write what is still buffered"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
+    def stats(self):
+        return {
+            "pending_posts": len(self._pending),
+            "pending_views": sum(self._pending.values()),
+            "flushed_views": self.flushed,
+            "flush_failures": self.flush_failures,
+            "ranked_posts": len(self._top),
+        }
+
+
+_settings = get_settings()
+view_counter = ViewCounter(
+    flush_interval=_settings.views_flush_interval,
+    top_k=_settings.views_top_k,
+    reload_interval=_settings.views_reload_interval,
+)
@@ -0,0 +1,50 @@
+"""Bytes on the wire and CPU per encoding for typical response bodies.
+
+Builds the bodies without a database: feed pages of summaries, one full
+post, and one export chunk of NDJSON rows. Each body is compressed with
+every encoding api.compression can use here (zstd and br only when their
+packages are installed), at the levels the middleware uses.
+
+    python -m benchmarks.bench_compression --body-bytes 4000
+"""
+import argparse
+import os
+import timeit
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+from api import compression, serializers  # noqa: E402
+from benchmarks.bench_serialization import make_posts  # noqa: E402
+
+
+def bodies(body_bytes: int):
+    orm, rows = make_posts(1000, body_bytes)
+    yield "feed page, 4", serializers._summary_row_list.dump_json([r._asdict() for r in rows[:4]])
+    yield "feed page, 20", serializers._summary_row_list.dump_json([r._asdict() for r in rows[:20]])
+    yield "feed page, 100", serializers._summary_row_list.dump_json([r._asdict() for r in rows[:100]])
+    yield "post", serializers.BlogContentResponse.model_validate(orm[0]).model_dump_json().encode()
+    yield "export chunk, 1000", b"".join(
+        serializers.BlogContentResponse.model_validate(post).model_dump_json().encode() + b"\n" for post in orm
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--body-bytes", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'body':<20} {'encoding':<9} {'bytes':>9} {'ratio':>6} {'us':>9} {'MB/s':>7}")
+    for name, body in bodies(args.body_bytes):
+        print(f"{name:<20} {'identity':<9} {len(body):>9} {1:>6.2f} {0:>9.1f} {'-':>7}")
+        for encoding in compression.ENCODERS:
+            size = len(compression.compress(encoding, body))
+            seconds = min(timeit.repeat(
+                lambda: compression.compress(encoding, body), number=args.repeat, repeat=5
+            )) / args.repeat
+            print(f"{name:<20} {encoding:<9} {size:>9} {len(body) / size:>6.2f} "
+                  f"{seconds * 1e6:>9.1f} {len(body) / seconds / 1e6:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
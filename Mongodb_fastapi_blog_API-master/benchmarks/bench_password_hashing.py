@@ -0,0 +1,79 @@
+"""Login latency under concurrency for each bcrypt cost setting.
+
+Simulates the CPU side of POST /login: N concurrent clients each verify a
+password through PasswordHasher while the event loop keeps serving. Also
+reports the worst event loop stall, which should stay near zero since
+hashing runs on the pool.
+
+    python -m benchmarks.bench_password_hashing --rounds 10 11 12 --concurrency 32
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from api.utils import PasswordHasher
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.005):
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run(rounds: int, concurrency: int, requests: int, workers):
+    hasher = PasswordHasher(rounds=rounds, workers=workers)
+    hashed = hasher.hash("correct horse battery staple")
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            start = time.perf_counter()
+            ok, _ = await hasher.verify_and_update_async("correct horse battery staple", hashed)
+            latencies.append(time.perf_counter() - start)
+            assert ok
+
+    stop = asyncio.Event()
+    lag = asyncio.create_task(measure_loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    hasher.shutdown()
+
+    return {
+        "rounds": rounds,
+        "throughput_rps": requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "max_loop_lag_ms": await lag * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None, help="hash pool size (default: CPU count)")
+    args = parser.parse_args()
+
+    print(f"{'rounds':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'loop lag ms':>12}")
+    for rounds in args.rounds:
+        r = asyncio.run(run(rounds, args.concurrency, args.requests, args.workers))
+        print(f"{r['rounds']:>6} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['max_loop_lag_ms']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
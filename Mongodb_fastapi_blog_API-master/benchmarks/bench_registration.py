@@ -0,0 +1,119 @@
+"""Concurrent signup throughput: pre-check SELECTs vs a single INSERT ... RETURNING.
+
+Drives both registration strategies straight against the database, with
+a constant fake password hash so only the SQL cost is compared. Every
+run registers fresh users and a share of duplicates (which must come
+back as conflicts).
+
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_registration --users 2000 --concurrency 50
+    python -m benchmarks.bench_registration          # temporary SQLite file
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import tempfile
+import time
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.db_config import DatabaseSettings, build_engine
+
+FAKE_HASH = "$2b$12$" + "x" * 53
+
+
+async def register_prechecked(db: AsyncSession, User, name: str, email: str) -> bool:
+    """The previous flow: SELECT by name, SELECT by email, INSERT, refresh"""
+    if (await db.execute(select(User).where(User.name == name))).scalar_one_or_none():
+        return False
+    if (await db.execute(select(User).where(User.email == email))).scalar_one_or_none():
+        return False
+    user = User(name=name, email=email, password=FAKE_HASH, api_key=secrets.token_hex(20))
+    db.add(user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # lost the race between the checks and the insert
+        await db.rollback()
+        return False
+    await db.refresh(user)
+    return True
+
+
+async def register_returning(db: AsyncSession, User, name: str, email: str) -> bool:
+    """The current flow: one INSERT ... RETURNING guarded by the unique indexes"""
+    try:
+        await db.execute(
+            insert(User)
+            .values(name=name, email=email, password=FAKE_HASH, api_key=secrets.token_hex(20))
+            .returning(User.id, User.name, User.email)
+        )
+        await db.commit()
+        return True
+    except IntegrityError:
+        await db.rollback()
+        return False
+
+
+async def run(strategy, sessionmaker, User, users: int, concurrency: int, duplicate_every: int, prefix: str):
+    semaphore = asyncio.Semaphore(concurrency)
+    created = conflicts = 0
+
+    async def signup(i):
+        nonlocal created, conflicts
+        # every Nth signup reuses an earlier name to exercise the conflict path
+        n = i - 1 if duplicate_every and i % duplicate_every == 0 and i else i
+        async with semaphore, sessionmaker() as db:
+            if await strategy(db, User, f"{prefix}{n}", f"{prefix}{n}@example.com"):
+                created += 1
+            else:
+                conflicts += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(signup(i) for i in range(users)))
+    elapsed = time.perf_counter() - started
+    return {"signups_per_s": users / elapsed, "elapsed_s": elapsed, "created": created, "conflicts": conflicts}
+
+
+async def main_async(args):
+    url = os.getenv("DATABASE_URL")
+    tmpdir = None
+    if not url:
+        tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite+aiosqlite:///{tmpdir.name}/bench.db"
+    os.environ["DATABASE_URL"] = url
+
+    from api.database import Base
+    from api.models import User
+
+    engine = build_engine(url, DatabaseSettings())
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessionmaker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    run_id = secrets.token_hex(3)
+    print(f"{'strategy':<12} {'signups/s':>10} {'created':>8} {'conflicts':>10}")
+    for label, strategy in (("pre-check", register_prechecked), ("returning", register_returning)):
+        r = await run(strategy, sessionmaker, User, args.users, args.concurrency,
+                      args.duplicate_every, f"bench-{run_id}-{label}-")
+        print(f"{label:<12} {r['signups_per_s']:>10.1f} {r['created']:>8} {r['conflicts']:>10}")
+
+    await engine.dispose()
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duplicate-every", type=int, default=10,
+                        help="make every Nth signup a duplicate (0 disables)")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Feed serialization cost: full posts vs summaries, model vs FAST_JSON paths.
+
+Serializes a page of posts without a database, the way each path does it:
+the old feed (ORM objects with bodies through BlogContentResponse), and
+the summary rows the feed now selects through BlogPostSummary (default),
+a TypedDict TypeAdapter, and orjson (if installed).
+
+    python -m benchmarks.bench_serialization --page-size 100 --body-bytes 4000
+"""
+import argparse
+import os
+import timeit
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from api import serializers  # noqa: E402
+from api.excerpts import summary_fields  # noqa: E402
+from api.models import BlogPost  # noqa: E402
+from api.schemas import BlogContentResponse  # noqa: E402
+
+
+def make_posts(count: int, body_bytes: int):
+    now = datetime.utcnow()
+    body = ("lorem ipsum " * (body_bytes // 12 + 1))[:body_bytes]
+    summary = summary_fields(body)
+    row_type = namedtuple("SummaryRow", [c.key for c in serializers.SUMMARY_COLUMNS])
+    orm, rows = [], []
+    for i in range(count):
+        created_at = now - timedelta(minutes=i)
+        orm.append(BlogPost(id=i, title=f"Post title {i}", body=body, author_name="author",
+                            author_id=1, created_at=created_at))
+        rows.append(row_type(id=i, title=f"Post title {i}", author_name="author", author_id=1,
+                             created_at=created_at, **summary))
+    return orm, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--body-bytes", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    orm, rows = make_posts(args.page_size, args.body_bytes)
+    full = TypeAdapter(List[BlogContentResponse])
+    summaries = serializers._summary_list
+    paths = {
+        "full posts, model (old)": lambda: full.dump_json(full.validate_python(orm, from_attributes=True)),
+        "summaries, model": lambda: summaries.dump_json(summaries.validate_python(rows, from_attributes=True)),
+        "summaries, TypedDict": lambda: serializers._summary_row_list.dump_json([r._asdict() for r in rows]),
+    }
+    if serializers.orjson is not None:
+        paths["summaries, orjson"] = lambda: serializers.orjson.dumps([r._asdict() for r in rows])
+
+    baseline = None
+    print(f"{'path':<26} {'us/page':>10} {'speedup':>8} {'bytes/page':>11}")
+    for name, fn in paths.items():
+        size = len(fn())
+        per_call = min(timeit.repeat(fn, number=args.repeat, repeat=5)) / args.repeat * 1e6
+        baseline = baseline or per_call
+        print(f"{name:<26} {per_call:>10.1f} {baseline / per_call:>7.1f}x {size:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Cold start: time from process launch to the first served request.
+
+Starts a single uvicorn worker on the app (the same thing each worker of
+main.py does) again and again and reports how long `import api.main`
+takes and how long until GET / answers. The database is migrated once
+beforehand, so the numbers cover what every worker pays on every start.
+
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_startup --runs 10
+    python -m benchmarks.bench_startup          # temporary SQLite file
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+IMPORT_PROBE = "import time; t = time.perf_counter(); import api.main; print(time.perf_counter() - t)"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_import(env: dict) -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], env=env, check=True,
+                         capture_output=True, text=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_first_request(env: dict, timeout: float) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).read()
+                return time.perf_counter() - started
+            except OSError:
+                if proc.poll() is not None:
+                    raise RuntimeError("server exited during startup; run it by hand to see why")
+                time.sleep(0.005)
+        raise RuntimeError(f"no response within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def summary(label: str, samples) -> str:
+    ms = sorted(s * 1000 for s in samples)
+    return f"{label:<22} {statistics.median(ms):>9.1f} {ms[0]:>9.1f} {ms[-1]:>9.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    env = dict(os.environ, LOG_LEVEL="WARNING")
+    tmpdir = None
+    if not env.get("DATABASE_URL"):
+        tmpdir = tempfile.TemporaryDirectory()
+        env["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmpdir.name}/bench.db"
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], env=env, check=True,
+                   capture_output=True)
+
+    imports = [time_import(env) for _ in range(args.runs)]
+    first = [time_first_request(env, args.timeout) for _ in range(args.runs)]
+
+    print(f"{'ms':<22} {'median':>9} {'min':>9} {'max':>9}")
+    print(summary("import api.main", imports))
+    print(summary("first request", first))
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
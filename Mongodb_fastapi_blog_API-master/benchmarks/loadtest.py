@@ -0,0 +1,333 @@
+"""Mixed-traffic load test of the whole app, in process.
+
+Boots api.main:app (lifespan included) on an httpx ASGI transport against
+a local database, seeds it with users and posts, then runs concurrent
+virtual clients that each pick an operation from a weighted mix:
+
+    register  POST /users/registration
+    login     POST /login
+    feed      GET /blog/ (following the cursor a few pages)
+    get       GET /blog/{id}
+    details   POST /users/details      (authenticated read: get_current_user)
+    create    POST /blog/
+    update    PUT /blog/{id}           (a post the client created)
+    delete    DELETE /blog/{id}        (a post the client created)
+
+Throughput and p50/p95/p99 per operation are printed and written to JSON.
+Compare two runs, e.g. before and after a change:
+
+    pip install -r requirements-dev.txt   # httpx, aiosqlite
+    python -m benchmarks.loadtest --out before.json
+    git checkout my-branch
+    python -m benchmarks.loadtest --out after.json --compare before.json
+
+By default a temporary SQLite file is used; set DATABASE_URL to run
+against a local Postgres (the seeded rows are left in place). Numbers
+include the in-process client, so compare runs made the same way rather
+than reading them as absolute server capacity.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+OPERATIONS = ("register", "login", "feed", "get", "details", "create", "update", "delete")
+DEFAULT_MIX = "feed=40,get=25,details=10,create=8,update=5,delete=2,login=6,register=4"
+PASSWORD = "loadtest-password"
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise SystemExit(f"Unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def git_revision() -> Optional[str]:
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here, capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here, capture_output=True, text=True)
+        return out.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, op: str, seconds: float, status_code: int):
+        self.latencies[op].append(seconds)
+        if status_code >= 400:
+            self.errors[op] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        routes = {}
+        for op, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            routes[op] = {
+                "requests": len(values),
+                "errors": self.errors[op],
+                "rps": len(values) / elapsed,
+                "mean_ms": sum(values) / len(values) * 1000,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+            }
+        return routes
+
+
+class Client:
+    """One virtual user: a logged-in account plus the posts it created"""
+
+    def __init__(self, http, rng: random.Random, account: str, token: str, state: "SharedState"):
+        self.http, self.rng, self.account, self.state = http, rng, account, state
+        self.auth = {"Authorization": f"Bearer {token}"}
+        self.own_posts: List[int] = []
+
+    async def register(self):
+        name = f"lt-new-{self.state.next_serial()}"
+        return await self.http.post("/users/registration", json={"name": name, "email": f"{name}@example.com", "password": PASSWORD})
+
+    async def login(self):
+        return await self.http.post("/login", data={"username": self.rng.choice(self.state.accounts), "password": PASSWORD})
+
+    async def feed(self):
+        response = await self.http.get("/blog/", params={"limit": 20})
+        for _ in range(self.rng.randint(0, 2)):
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+            response = await self.http.get("/blog/", params={"limit": 20, "after": cursor})
+        return response
+
+    async def get(self):
+        return await self.http.get(f"/blog/{self.rng.choice(self.state.post_ids)}")
+
+    async def details(self):
+        return await self.http.post("/users/details", headers=self.auth)
+
+    async def create(self):
+        response = await self.http.post("/blog/", headers=self.auth, json={
+            "title": f"Load test post {self.state.next_serial()}",
+            "body": self.state.body,
+        })
+        if response.status_code < 400:
+            self.own_posts.append(response.json()["id"])
+        return response
+
+    async def update(self):
+        if not self.own_posts:
+            return await self.create()
+        id = self.rng.choice(self.own_posts)
+        return await self.http.put(f"/blog/{id}", headers=self.auth, json={"title": f"Edited {id}", "body": self.state.body})
+
+    async def delete(self):
+        if not self.own_posts:
+            return await self.create()
+        return await self.http.delete(f"/blog/{self.own_posts.pop()}", headers=self.auth)
+
+
+class SharedState:
+    def __init__(self, accounts: List[str], post_ids: List[int], body_bytes: int):
+        self.accounts = accounts
+        self.post_ids = post_ids
+        self.body = ("lorem ipsum dolor sit amet " * (body_bytes // 27 + 1))[:body_bytes]
+        self._serial = 0
+        self._run = f"{os.getpid()}-{int(time.time())}"
+
+    def next_serial(self) -> str:
+        self._serial += 1
+        return f"{self._run}-{self._serial}"
+
+
+async def seed(users: int, posts: int, body_bytes: int, rng: random.Random):
+    """Insert seed rows directly; returns (account names, post ids)"""
+    from sqlalchemy import func, insert, select
+
+    from api.database import session_factory
+    from api.excerpts import summary_fields
+    from api.models import BlogPost, User
+    from api.utils import hasher
+
+    prefix = f"lt-{int(time.time())}"
+    password = await hasher.hash_async(PASSWORD)
+    accounts = [f"{prefix}-u{i}" for i in range(users)]
+    now = datetime.utcnow()
+    body = ("lorem ipsum dolor sit amet " * (body_bytes // 27 + 1))[:body_bytes]
+    summary = summary_fields(body)
+
+    async with session_factory()() as db:
+        await db.execute(insert(User), [
+            {"name": name, "email": f"{name}@example.com", "password": password, "api_key": None}
+            for name in accounts
+        ])
+        ids = dict((await db.execute(select(User.name, User.id).where(User.name.in_(accounts)))).all())
+        for start in range(0, posts, 1000):
+            await db.execute(insert(BlogPost), [
+                {
+                    "title": f"Seed post {i}",
+                    "body": body,
+                    **summary,
+                    "author_id": ids[accounts[i % users]],
+                    "author_name": accounts[i % users],
+                    "created_at": now - timedelta(seconds=rng.randint(0, 90 * 86400)),
+                }
+                for i in range(start, min(posts, start + 1000))
+            ])
+        await db.commit()
+        post_ids = list((await db.execute(
+            select(BlogPost.id).where(BlogPost.author_name.like(f"{prefix}-%"))
+        )).scalars())
+        total = (await db.execute(select(func.count(BlogPost.id)))).scalar_one()
+    return accounts, post_ids, total
+
+
+async def run(args) -> dict:
+    import httpx
+
+    from api.main import app
+
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    ops, weights = list(mix), list(mix.values())
+    recorder = Recorder()
+
+    async with app.router.lifespan_context(app):
+        seed_started = time.perf_counter()
+        accounts, post_ids, total_posts = await seed(args.users, args.posts, args.body_bytes, rng)
+        print(f"seeded {len(accounts)} users and {len(post_ids)} posts "
+              f"({total_posts} in table) in {time.perf_counter() - seed_started:.1f}s", file=sys.stderr)
+        state = SharedState(accounts, post_ids, args.body_bytes)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as http:
+            clients = []
+            for i in range(args.concurrency):
+                account = accounts[i % len(accounts)]
+                response = await http.post("/login", data={"username": account, "password": PASSWORD})
+                response.raise_for_status()
+                clients.append(Client(http, random.Random(rng.random()), account, response.json()["access_token"], state))
+
+            deadline = time.perf_counter() + args.duration
+            warmup_until = time.perf_counter() + args.warmup
+
+            async def drive(client: Client):
+                while time.perf_counter() < deadline:
+                    op = client.rng.choices(ops, weights)[0]
+                    started = time.perf_counter()
+                    response = await getattr(client, op)()
+                    if started >= warmup_until:
+                        recorder.record(op, time.perf_counter() - started, response.status_code)
+
+            await asyncio.gather(*(drive(c) for c in clients))
+            elapsed = time.perf_counter() - warmup_until
+
+    routes = recorder.summary(elapsed)
+    total = sum(r["requests"] for r in routes.values())
+    return {
+        "revision": git_revision(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "database": args.database_backend,
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "database_backend")},
+        "elapsed_s": elapsed,
+        "total": {
+            "requests": total,
+            "errors": sum(r["errors"] for r in routes.values()),
+            "rps": total / elapsed if elapsed else 0.0,
+        },
+        "routes": routes,
+    }
+
+
+def print_report(result: dict):
+    print(f"{'operation':<10} {'reqs':>7} {'errs':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for op, r in result["routes"].items():
+        print(f"{op:<10} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+    t = result["total"]
+    print(f"{'total':<10} {t['requests']:>7} {t['errors']:>5} {t['rps']:>8.1f}")
+
+
+def print_comparison(baseline: dict, result: dict):
+    def change(old: float, new: float) -> str:
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"\nvs {baseline.get('revision') or 'baseline'} ({baseline.get('timestamp', '?')})")
+    print(f"{'operation':<10} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for op, new in result["routes"].items():
+        old = baseline.get("routes", {}).get(op)
+        if old is None:
+            print(f"{op:<10} {'(new)':>9}")
+            continue
+        print(f"{op:<10} {change(old['rps'], new['rps']):>9} {change(old['p50_ms'], new['p50_ms']):>9} "
+              f"{change(old['p95_ms'], new['p95_ms']):>9} {change(old['p99_ms'], new['p99_ms']):>9}")
+    print(f"{'total':<10} {change(baseline['total']['rps'], result['total']['rps']):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200, help="seeded users")
+    parser.add_argument("--posts", type=int, default=5000, help="seeded posts")
+    parser.add_argument("--body-bytes", type=int, default=1500)
+    parser.add_argument("--concurrency", type=int, default=32, help="virtual clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds, including warm-up")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds not recorded")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight,...")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="loadtest-results.json")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    args = parser.parse_args()
+    parse_mix(args.mix)
+
+    tmpdir = None
+    if not os.getenv("DATABASE_URL"):
+        tmpdir = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmpdir.name}/loadtest.db"
+    args.database_backend = os.environ["DATABASE_URL"].split(":", 1)[0]
+    # Schema from the migrations; limits and mail would otherwise measure
+    # 429s and SMTP timeouts instead of the app
+    os.environ.setdefault("DB_AUTO_MIGRATE", "1")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    os.environ.setdefault("MAIL_MAX_RETRIES", "0")
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    os.environ.setdefault("SECRET_KEY", "loadtest-secret-key")
+    os.environ.setdefault("ALGORITHM", "HS256")
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nwrote {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), result)
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
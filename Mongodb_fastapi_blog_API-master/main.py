@@ -1,11 +1,88 @@
-import uvicorn
+"""Server entry point.
+
+    python main.py            # production: one worker per CPU
+    RELOAD=1 python main.py   # development: single process with auto-reload
+
+Settings (env):
+    HOST, PORT           bind address (0.0.0.0:8000)
+    WEB_CONCURRENCY      worker processes (default: CPUs available to us);
+                         exported to the workers, which refuse a memory://
+                         BROADCAST_URL when there are several
+    KEEP_ALIVE           seconds an idle keep-alive connection stays open (5)
+    BACKLOG              listen() backlog (2048)
+    GRACEFUL_TIMEOUT     seconds to let in-flight requests finish on SIGTERM (30);
+                         open /blog/stream connections never finish and are
+                         cut when it runs out
+    LIMIT_CONCURRENCY    per-worker cap on open connections before 503s (off)
+    ACCESS_LOG           uvicorn's own access log (off; requests are logged
+                         and measured by the app's middleware)
+    FORWARDED_ALLOW_IPS  comma-separated proxy addresses whose X-Forwarded-For
+                         is trusted as the client address (127.0.0.1); "*"
+                         when only the proxy can reach us, as on Heroku.
+                         Per-IP rate limits count every client that comes
+                         through an untrusted proxy as the proxy
+
+With several workers, the response cache (RESPONSE_CACHE_URL) must be
+shared, rate limits (RATE_LIMIT_URL) should be, and the workers publish
+their metrics in METRICS_DIR (a fresh temporary directory unless set;
+its files are removed at startup) so that /metrics covers all of them.
+
+Each worker has its own database pool, so the connections the app can
+open are WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW), plus, with a
+Postgres BROADCAST_URL, WEB_CONCURRENCY * 3 for the broadcaster: a pool
+of up to two for NOTIFY and the LISTEN connection.
+"""
+import glob
+import importlib.util
 import os
+import shutil
+import tempfile
+
+import uvicorn
+
+
+def _available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _optional(module: str, fallback: str) -> str:
+    return module if importlib.util.find_spec(module) else fallback
+
+
+def _flag(name: str) -> bool:
+    return os.getenv(name, "false").lower() in ("1", "true", "yes")
+
 
 if __name__ == "__main__":
-    port = int(os.getenv("PORT", 8000))
+    reload = _flag("RELOAD")
+    limit_concurrency = os.getenv("LIMIT_CONCURRENCY")
+    workers = 1 if reload else int(os.getenv("WEB_CONCURRENCY", 0)) or _available_cpus()
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    temporary_metrics_dir = None
+    if workers > 1:
+        if os.getenv("METRICS_DIR"):
+            for path in glob.glob(os.path.join(os.environ["METRICS_DIR"], "*.json")):
+                os.remove(path)
+        else:
+            temporary_metrics_dir = os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="blog-metrics-")
     uvicorn.run(
         "api.main:app",
-        host="0.0.0.0",
-        port=port,
-        reload=True
-    )
\ No newline at end of file
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", 8000)),
+        reload=reload,
+        workers=None if reload else workers,
+        loop=_optional("uvloop", "asyncio"),
+        http=_optional("httptools", "h11"),
+        timeout_keep_alive=int(os.getenv("KEEP_ALIVE", 5)),
+        backlog=int(os.getenv("BACKLOG", 2048)),
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_TIMEOUT", 30)),
+        limit_concurrency=int(limit_concurrency) if limit_concurrency else None,
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        access_log=_flag("ACCESS_LOG"),
+    )
+    if temporary_metrics_dir:
+        shutil.rmtree(temporary_metrics_dir, ignore_errors=True)
@@ -0,0 +1,70 @@
+"""Alembic environment.
+
+Runs against DATABASE_URL from the CLI, or on a connection handed over in
+`config.attributes["connection"]` when the app migrates at startup
+(DB_AUTO_MIGRATE).
+"""
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.engine import Connection
+
+from api import models  # noqa: F401  (registers the tables on Base.metadata)
+from api.config import get_settings
+from api.database import Base
+from api.db_config import build_engine
+
+config = context.config
+target_metadata = Base.metadata
+
+# Created by migrations but not declared on the models (Postgres search
+# column); keep autogenerate from proposing to drop them
+_UNMANAGED = {"search_vector", "ix_blog_posts_search_vector"}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    return name not in _UNMANAGED
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=get_settings().database.url,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    settings = get_settings().database
+    engine = build_engine(settings.url, settings)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+        await connection.commit()
+    await engine.dispose()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        do_run_migrations(connection)
+        return
+    if config.config_file_name is not None:
+        fileConfig(config.config_file_name)
+    asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
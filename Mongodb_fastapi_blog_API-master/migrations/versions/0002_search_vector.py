@@ -0,0 +1,48 @@
+"""full-text search column
+
+Weighted tsvector over title (A) and body (B), generated by Postgres, with
+a GIN index. Other databases search with the in-process index instead, so
+this is a no-op there.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 02:52:10.114203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    # IF NOT EXISTS: databases set up by the old startup hook already have both
+    op.execute(
+        "ALTER TABLE blog_posts ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        "GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(body, '')), 'B')"
+        ") STORED"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_blog_posts_search_vector "
+        "ON blog_posts USING GIN (search_vector)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.drop_index("ix_blog_posts_search_vector", table_name="blog_posts")
+    op.drop_column("blog_posts", "search_vector")
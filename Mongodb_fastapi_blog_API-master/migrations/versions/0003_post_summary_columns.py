@@ -0,0 +1,36 @@
+"""post summary columns
+
+Preview columns for list endpoints. Nullable so the migration is only a
+catalog change on large tables; fill existing rows with
+`python -m api.manage backfill-summaries`.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 02:49:08.766645
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('blog_posts', sa.Column('excerpt', sa.String(length=300), nullable=True))
+    op.add_column('blog_posts', sa.Column('body_length', sa.Integer(), nullable=True))
+    op.add_column('blog_posts', sa.Column('reading_minutes', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('blog_posts', 'reading_minutes')
+    op.drop_column('blog_posts', 'body_length')
+    op.drop_column('blog_posts', 'excerpt')
@@ -0,0 +1,33 @@
+"""post view counts
+
+views is NOT NULL with a constant default, which Postgres 11+ adds without
+rewriting the table. The index backs the popular-posts ranking.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 02:50:56.672730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('blog_posts', sa.Column('views', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_index('ix_blog_posts_views_id', 'blog_posts', [sa.literal_column('views DESC'), sa.literal_column('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_blog_posts_views_id', table_name='blog_posts')
+    op.drop_column('blog_posts', 'views')
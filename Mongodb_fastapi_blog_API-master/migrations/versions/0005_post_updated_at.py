@@ -0,0 +1,31 @@
+"""post updated_at
+
+A nullable column without a default, so adding it does not touch existing
+rows. It feeds Last-Modified on GET /blog/{id}.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 02:56:46.235498
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('blog_posts', sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('blog_posts', 'updated_at')
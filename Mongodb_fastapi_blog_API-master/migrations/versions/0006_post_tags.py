@@ -0,0 +1,52 @@
+"""post tags
+
+New tables only. The primary key of post_tags (post_id, tag_id) serves
+lookups by post; ix_post_tags_tag_created_at_post serves the feed by tag.
+post_tags.post_id is deferred and does not cascade, so the delete route can
+remove a post's tags, with their counts, after the post itself.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 02:59:11.252377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('tags',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('post_count', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index('ix_tags_post_count_name', 'tags', [sa.literal_column('post_count DESC'), 'name'], unique=False)
+    op.create_table('post_tags',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['blog_posts.id'], initially='DEFERRED', deferrable=True),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id', 'tag_id')
+    )
+    op.create_index('ix_post_tags_tag_created_at_post', 'post_tags', ['tag_id', sa.literal_column('created_at DESC'), sa.literal_column('post_id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_post_tags_tag_created_at_post', table_name='post_tags')
+    op.drop_table('post_tags')
+    op.drop_index('ix_tags_post_count_name', table_name='tags')
+    op.drop_table('tags')
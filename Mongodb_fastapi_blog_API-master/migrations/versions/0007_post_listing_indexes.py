@@ -0,0 +1,34 @@
+"""post listing indexes
+
+The keyset indexes behind the feed and the per-author listing. They
+used to be created by create_all() on new databases only, so databases
+stamped at 0001 may or may not have them; IF NOT EXISTS covers both.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 03:20:12.401233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_blog_posts_created_at_id', 'blog_posts', [sa.literal_column('created_at DESC'), sa.literal_column('id DESC')], unique=False, if_not_exists=True)
+    op.create_index('ix_blog_posts_author_created_at_id', 'blog_posts', ['author_id', sa.literal_column('created_at DESC'), sa.literal_column('id DESC')], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_blog_posts_author_created_at_id', table_name='blog_posts', if_exists=True)
+    op.drop_index('ix_blog_posts_created_at_id', table_name='blog_posts', if_exists=True)
@@ -0,0 +1,67 @@
+"""untag the posts of deleted users
+
+Deleting a user cascades to their posts, but post_tags.post_id does not
+cascade (api/tags.py removes a post's tags itself so that it can adjust
+tags.post_count). Users are only deleted outside the app, so a trigger
+untags their posts and adjusts the counts before the cascade; otherwise
+the leftover rows fail the deferred foreign key at commit.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 04:05:31.518046
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_AUTHOR_POST_TAGS = (
+    "SELECT post_tags.tag_id FROM post_tags "
+    "JOIN blog_posts ON blog_posts.id = post_tags.post_id "
+    "WHERE blog_posts.author_id = OLD.id"
+)
+
+# Valid in both Postgres and SQLite trigger bodies
+_UNTAG = f"""
+    UPDATE tags SET post_count = post_count - (
+        SELECT count(*) FROM ({_AUTHOR_POST_TAGS}) AS removed WHERE removed.tag_id = tags.id
+    )
+    WHERE id IN ({_AUTHOR_POST_TAGS});
+    DELETE FROM post_tags WHERE post_id IN (SELECT id FROM blog_posts WHERE author_id = OLD.id);
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(f"""
+            CREATE FUNCTION untag_author_posts() RETURNS trigger AS $$
+            BEGIN
+                {_UNTAG}
+                RETURN OLD;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute(
+            "CREATE TRIGGER users_untag_posts BEFORE DELETE ON users "
+            "FOR EACH ROW EXECUTE FUNCTION untag_author_posts()"
+        )
+    else:
+        op.execute(f"CREATE TRIGGER users_untag_posts BEFORE DELETE ON users FOR EACH ROW BEGIN {_UNTAG} END")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP TRIGGER users_untag_posts ON users")
+        op.execute("DROP FUNCTION untag_author_posts()")
+    else:
+        op.execute("DROP TRIGGER users_untag_posts")